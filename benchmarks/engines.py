@@ -0,0 +1,71 @@
+# engines.py - Check that every engine renders the same report files
+#
+# Generates a synthetic period (benchmarks/generate.py) and runs timecard.py on
+# it once per engine, then compares the output folders byte for byte. At the
+# default 3000 employees a few dozen week and employee totals land on .xx5,
+# where two ways of adding the same hours print different 2-decimal totals.
+#
+#   python benchmarks/engines.py [--employees 3000] [--seed 0]
+import argparse
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(BENCH_DIR), 'timecard.py')
+sys.path.insert(0, BENCH_DIR)
+
+import generate  # noqa: E402
+
+ENGINES = {
+    'light': ['--engine', 'light'],
+    'pandas': ['--engine', 'pandas'],
+    'stream': ['--engine', 'pandas', '--stream', '--chunk-rows', '5000'],
+    'incremental': ['--engine', 'pandas', '--incremental'],
+}
+
+
+def run_engine(options, input_dir, work_dir):
+    """Runs timecard.py with options on a copy of input_dir, returns its output folder."""
+    shutil.copytree(input_dir, os.path.join(work_dir, 'input'))
+    result = subprocess.run([sys.executable, SCRIPT, '--no-cache', *options], cwd=work_dir,
+                            capture_output=True, text=True)
+    if result.returncode:
+        sys.exit(f"timecard.py {' '.join(options)} failed:\n{result.stderr}")
+    return os.path.join(work_dir, 'output')
+
+
+def differing_files(left, right):
+    """Names of the files that are missing on one side or differ, in both folders."""
+    names = sorted(set(os.listdir(left)) | set(os.listdir(right)))
+    _, mismatch, errors = filecmp.cmpfiles(left, right, names, shallow=False)
+    return mismatch + errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that all engines render identical files.")
+    parser.add_argument('--employees', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        input_dir = os.path.join(work, 'generated')
+        generate.generate(input_dir, args.employees, seed=args.seed)
+        outputs = {engine: run_engine(options, input_dir, os.path.join(work, engine))
+                   for engine, options in ENGINES.items()}
+        reference, *others = ENGINES
+        failed = False
+        for engine in others:
+            differ = differing_files(outputs[reference], outputs[engine])
+            failed |= bool(differ)
+            status = f"differs from {reference}: {', '.join(differ)}" if differ else 'identical'
+            print(f"{engine:<12} {status}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
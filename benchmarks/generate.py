@@ -0,0 +1,145 @@
+# generate.py - Write synthetic approved_hours/summary_hours/payroll_info triples
+#
+# The files follow the layout of the payroll exports in input/, so any period
+# folder written here can be fed straight to timecard.py.
+#
+#   python benchmarks/generate.py --employees 10000 --days 14 --periods 2 --out /tmp/timecard
+import argparse
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+DETAIL_HEADER = ['Employee Number', 'Name', 'Date', 'Reg Rate', 'Reg Hours', 'OT Rate', 'OT Hours']
+SUMMARY_HEADER = ['Employee Number', 'Name', 'Manager', 'Regular', 'Overtime', 'Holiday',
+                  'Bereavement', 'Paid Time Off', 'Personal Day', 'Sick Leave', 'Sick Leave (CA)',
+                  'Volunteer', 'Voting', 'Total PTO', 'Total Hours', 'Approved?']
+PAYROLL_HEADER = ['Employee #', 'Hire Date', 'Name', 'Job Title', 'Location', 'Work Schedule',
+                  'Employment Status', 'Manager']
+
+LAST_NAMES = ['Li', 'Shah', 'Nguyen', 'Garcia', 'Smith', 'Patel', 'Kim', 'Lopez', 'Chen', 'Wilson',
+              'Tu', 'Pore', 'Basu', 'Agrawal', 'Radindra', 'Brown', 'Singh', 'Martin', 'Reddy', 'Ali']
+FIRST_NAMES = ['Alexander', 'Jash', 'Justin', 'Sean', 'Catherine', 'Davel', 'Atharva', 'Maria',
+               'Wei', 'Priya', 'Samprikta', 'Swastik', 'Emma', 'Noah', 'Olivia', 'Liam']
+TITLES = ['Software Engineer', 'Junior Software Engineer', 'AI Software Engineer',
+          'Junior AI Engineer', 'Project Coordinator', 'Designer']
+LOCATIONS = ['CA (Remote)', 'MI (Remote)', 'TX (Remote)', 'MD (Remote)', 'OH (Remote) ', 'NY (Remote)']
+SCHEDULES = [('Full-time 40 hours', 'Full-Time', 8.0), ('Part-time 20 hours', 'Internship', 4.0)]
+
+
+def fmt(hours):
+    return f"{hours:.4f}".rstrip('0').rstrip('.') if hours else ''
+
+
+def make_workforce(employees, managers, rng):
+    """One dict per employee with the payroll_info fields used by the generator."""
+    manager_names = [f"{rng.choice(FIRST_NAMES)} {chr(65 + m % 26)}." for m in range(managers)]
+    workforce = []
+    for n in range(employees):
+        schedule, status, daily = rng.choice(SCHEDULES)
+        workforce.append({
+            'id': str(100 + n),
+            'name': f"{rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}",
+            'title': rng.choice(TITLES),
+            'location': rng.choice(LOCATIONS),
+            'schedule': schedule,
+            'status': status,
+            'daily': daily,
+            'manager': manager_names[n % managers],
+            'hire_date': f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(18, 25)}",
+        })
+    return workforce
+
+
+def write_period(out_dir, workforce, start, days, ot_share, pto_share, missing_payroll_share, rng):
+    """
+    Writes the three input files for one period starting on start (a Sunday).
+    Weekends are skipped, so rows ~= employees * days * 5/7.
+
+    Returns:
+        int: number of approved_hours rows written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rows = 0
+    with open(os.path.join(out_dir, 'approved_hours.csv'), 'w', newline='') as detail_file, \
+            open(os.path.join(out_dir, 'summary_hours.csv'), 'w', newline='') as summary_file, \
+            open(os.path.join(out_dir, 'payroll_info.csv'), 'w', newline='') as payroll_file:
+        detail, summary, payroll = (csv.writer(detail_file), csv.writer(summary_file),
+                                    csv.writer(payroll_file))
+        detail.writerow(DETAIL_HEADER)
+        summary.writerow(SUMMARY_HEADER)
+        payroll.writerow(PAYROLL_HEADER)
+
+        for emp in workforce:
+            regular = overtime = 0
+            for offset in range(days):
+                day = start + timedelta(days=offset)
+                if day.weekday() >= 5:
+                    continue
+                reg = round(max(0.0, rng.gauss(emp['daily'], 1.5)), 4)
+                ot = round(rng.uniform(0.25, 3), 4) if rng.random() < ot_share else 0
+                detail.writerow([emp['id'], emp['name'], f"{day} 00:00:00", '', fmt(reg), '', fmt(ot)])
+                regular += reg
+                overtime += ot
+                rows += 1
+
+            holiday = pto = sick = 0
+            if rng.random() < pto_share:
+                holiday, pto, sick = rng.choice([(8, 0, 0), (0, 8, 0), (0, 0, 4), (0, 16, 0)])
+            total_pto = holiday + pto + sick
+            summary.writerow([emp['id'], emp['name'], emp['manager'], fmt(round(regular, 2)),
+                              fmt(round(overtime, 2)), fmt(holiday), '', fmt(pto), '', fmt(sick),
+                              '', '', '', fmt(total_pto),
+                              fmt(round(regular + overtime + total_pto, 2)), 'Yes'])
+            if rng.random() >= missing_payroll_share:
+                payroll.writerow([emp['id'], emp['hire_date'], emp['name'], emp['title'],
+                                  emp['location'], emp['schedule'], emp['status'], emp['manager']])
+    return rows
+
+
+def generate(out, employees, days=14, periods=1, start=date(2025, 6, 15), ot_share=0.05,
+             pto_share=0.1, missing_payroll_share=0.01, managers=None, seed=0):
+    """
+    Writes periods consecutive period folders (period_01, period_02, ...)
+    under out, or the files directly into out when periods is 1.
+
+    Returns:
+        list: (folder, approved_hours rows) per period
+    """
+    rng = random.Random(seed)
+    workforce = make_workforce(employees, managers or max(1, employees // 25), rng)
+    written = []
+    for period in range(periods):
+        out_dir = out if periods == 1 else os.path.join(out, f"period_{period + 1:02d}")
+        rows = write_period(out_dir, workforce, start + timedelta(days=period * days), days,
+                            ot_share, pto_share, missing_payroll_share, rng)
+        written.append((out_dir, rows))
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic timecard input files.")
+    parser.add_argument('--out', required=True, help="folder to write the input files into")
+    parser.add_argument('--employees', type=int, default=100)
+    parser.add_argument('--days', type=int, default=14, help="calendar days per period")
+    parser.add_argument('--periods', type=int, default=1)
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2025, 6, 15),
+                        help="first day of the first period (YYYY-MM-DD, a Sunday)")
+    parser.add_argument('--ot-share', type=float, default=0.05,
+                        help="share of daily rows with OT hours")
+    parser.add_argument('--pto-share', type=float, default=0.1,
+                        help="share of employees with holiday/PTO/sick hours")
+    parser.add_argument('--missing-payroll-share', type=float, default=0.01,
+                        help="share of employees left out of payroll_info.csv")
+    parser.add_argument('--managers', type=int, help="default: one per 25 employees")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for out_dir, rows in generate(args.out, args.employees, args.days, args.periods, args.start,
+                                  args.ot_share, args.pto_share, args.missing_payroll_share,
+                                  args.managers, args.seed):
+        print(f"Wrote {rows} approved_hours rows to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
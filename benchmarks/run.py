@@ -0,0 +1,185 @@
+# run.py - Per-stage benchmark of the timecard pipeline on synthetic inputs
+#
+# For each size a synthetic period is generated (benchmarks/generate.py) and
+# the pipeline stages are timed in a fresh process, recording wall time and
+# peak RSS after each stage. That process is run --repeats times and the
+# fastest wall time per stage counts. Results are saved as JSON and compared
+# against a stored baseline; stages that got slower than --tolerance, and by
+# more than MIN_SLOWDOWN seconds, are flagged. Even the fastest of 5 runs
+# drifts by up to 50% over a few minutes on a busy or shared machine, so the
+# default tolerance only catches real slowdowns; to compare two versions more
+# closely, run them back to back on the same sizes.
+#
+#   python benchmarks/run.py                        # 100, 10k and 1M rows
+#   python benchmarks/run.py --rows 100 10000 --update-baseline
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+import generate  # noqa: E402
+
+DEFAULT_ROWS = [100, 10_000, 1_000_000]
+WEEKDAYS_PER_PERIOD = 10
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+REPEATS = 5
+# slowdowns below this are timer and scheduler noise, even on the fastest run
+MIN_SLOWDOWN = 0.02  # seconds
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure(input_dir):
+    """Runs every pipeline stage once on input_dir, returns {stage: {...}}."""
+    import pandas  # noqa: F401 - imported up front so read_csv_files times parsing only
+    import timecard
+
+    stages = {}
+
+    def stage(name, fn, *args):
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = fn(*args)
+        stages[name] = {'wall': time.perf_counter() - started, 'peak_rss_mb': peak_rss_mb()}
+        return result
+
+    with tempfile.TemporaryDirectory() as out:
+        detail_data, payroll_info, summary_hours = stage(
+            'read_csv_files', timecard.read_csv_files, input_dir)
+        timecard_detail, start_date, end_date = stage(
+            'process_timecard_detail', timecard.process_timecard_detail_columnar, detail_data)
+        timecard_summary, total = stage(
+            'process_summary_hours', timecard.process_summary_hours, summary_hours)
+        info = stage('process_payroll_info', timecard.process_payroll_info, payroll_info)
+        report = stage('aggregate_report', timecard.aggregate_report, info, timecard_summary,
+                       timecard_detail, start_date, end_date)
+        stage('write_summary_csv', timecard.write_file_streamed,
+              os.path.join(out, 'summary.csv'), timecard.write_summary_csv, report)
+        stage('write_detail_csv', timecard.write_file_streamed,
+              os.path.join(out, 'detail.csv'), timecard.write_detail_csv, report)
+        stage('write_html_report', timecard.write_file_streamed,
+              os.path.join(out, 'report.html'), timecard.write_html_report, report)
+    stages['total'] = {'wall': sum(s['wall'] for s in stages.values()),
+                       'peak_rss_mb': peak_rss_mb()}
+    return stages
+
+
+def run_size(rows, work_dir, seed, repeats=REPEATS):
+    """
+    Measures one generated period repeats times, each in a fresh process.
+    Per stage the fastest wall time is kept, with the median next to it.
+    """
+    employees = max(1, rows // WEEKDAYS_PER_PERIOD)
+    input_dir = os.path.join(work_dir, f"rows_{rows}")
+    (_, written), = generate.generate(input_dir, employees, seed=seed)
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, __file__, '--measure', input_dir],
+                                capture_output=True, text=True)
+        if result.returncode:
+            sys.exit(f"benchmark at {rows} rows failed:\n{result.stderr}")
+        runs.append(json.loads(result.stdout))
+    stages = {}
+    for name in runs[0]:
+        walls = [run[name]['wall'] for run in runs]
+        stages[name] = {'wall': min(walls), 'median_wall': statistics.median(walls),
+                        'peak_rss_mb': max(run[name]['peak_rss_mb'] for run in runs)}
+    return {'rows': written, 'employees': employees, 'stages': stages}
+
+
+def compare(results, baseline, tolerance):
+    """Returns the (rows, stage, baseline wall, wall) entries that regressed."""
+    regressions = []
+    for size, result in results['sizes'].items():
+        base = baseline.get('sizes', {}).get(size)
+        if not base:
+            continue
+        for name, timing in result['stages'].items():
+            base_wall = base['stages'].get(name, {}).get('wall')
+            if base_wall and timing['wall'] > base_wall * (1 + tolerance) and \
+                    timing['wall'] - base_wall > MIN_SLOWDOWN:
+                regressions.append((size, name, base_wall, timing['wall']))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'Rows':>9} {'Stage':<26} {'Wall (s)':>9} {'Peak RSS (MB)':>14}")
+    for size, result in results['sizes'].items():
+        for name, timing in result['stages'].items():
+            print(f"{size:>9} {name:<26} {timing['wall']:>9.3f} {timing['peak_rss_mb']:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the timecard pipeline per stage.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="approved_hours row counts to benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.6,
+                        help="flag stages more than this fraction slower than the baseline")
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+                        help="measuring runs per size, the fastest time of each stage counts")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'repeats': args.repeats,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.rows:
+            print(f"Benchmarking {rows} rows...")
+            results['sizes'][str(rows)] = run_size(rows, work_dir, args.seed, args.repeats)
+    print_results(results)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"bench_{results['timestamp'].replace(':', '')}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote results: {path}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Updated baseline: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for size, name, base_wall, wall in regressions:
+            print(f"REGRESSION {size} rows {name}: {base_wall:.3f}s -> {wall:.3f}s")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.")
+    else:
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one.")
+
+
+if __name__ == "__main__":
+    main()
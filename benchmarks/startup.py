@@ -0,0 +1,77 @@
+# startup.py - Compare cold start of the stdlib (light) and pandas paths
+#
+# Runs timecard.py on a small period under `python -X importtime` and reports
+# wall time and total import time for each engine, plus the slowest imports.
+#
+#   python benchmarks/startup.py [--input input/April] [--runs 5] [--exe dist/timecard]
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'timecard.py')
+INPUT_FILES = ['approved_hours.csv', 'payroll_info.csv', 'summary_hours.csv']
+
+
+def parse_importtime(stderr):
+    """Returns (total import seconds, [(cumulative seconds, module)]) from -X importtime output."""
+    total, modules = 0, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        total += int(self_us)
+        if not module.startswith(' ' * 3):  # top-level imports only
+            modules.append((int(cumulative_us) / 1e6, module.strip()))
+    return total / 1e6, sorted(modules, reverse=True)
+
+
+def time_run(cmd, cwd):
+    started = time.perf_counter()
+    result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        sys.exit(f"{' '.join(cmd)} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare timecard.py cold start per engine.")
+    parser.add_argument('--input', default=os.path.join(ROOT, 'input'),
+                        help="period folder with the three input CSVs")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--exe', help="also time a built executable (e.g. dist/timecard)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        os.makedirs(os.path.join(work, 'input'))
+        for name in INPUT_FILES:
+            shutil.copy(os.path.join(args.input, name), os.path.join(work, 'input', name))
+
+        runs = {
+            'pandas': [sys.executable, '-X', 'importtime', SCRIPT, '--engine', 'pandas', '--no-cache'],
+            'light': [sys.executable, '-X', 'importtime', SCRIPT, '--engine', 'light', '--no-cache'],
+        }
+        if args.exe:
+            runs['exe'] = [os.path.abspath(args.exe), '--no-cache']
+
+        print(f"{'Engine':<8} {'Wall (median)':>14} {'Imports':>9}  Slowest imports")
+        for engine, cmd in runs.items():
+            walls, imports, slowest = [], [], []
+            for _ in range(args.runs):
+                wall, stderr = time_run(cmd, work)
+                walls.append(wall)
+                import_total, slowest = parse_importtime(stderr)
+                imports.append(import_total)
+            top = ', '.join(f"{module} {seconds:.3f}s" for seconds, module in slowest[:3])
+            print(f"{engine:<8} {statistics.median(walls):>13.3f}s "
+                  f"{statistics.median(imports):>8.3f}s  {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,26 @@
-import pandas as pd
-from datetime import date, timedelta, datetime
+from datetime import date, datetime
+from array import array
 from html import escape
+import argparse
+import contextlib
+import cProfile
+import csv
+import difflib
+import fnmatch
+import glob
+import hashlib
+import importlib
+import io
+import json
 import os
+import pickle
+import select
+import sys
+import threading
+import time
+import tracemalloc
+from functools import partial
+from itertools import islice
 
 VERSION = '0.2'
 VER_DATE = '6/3/2025'
@@ -9,166 +28,743 @@ EXE = False
 if EXE:
     INPUT_DIR = os.path.join(os.getcwd(), "timecard/input")
     OUTPUT_DIR = os.path.join(os.getcwd(), "timecard/output")
+    CACHE_DIR = os.path.join(os.getcwd(), "timecard/cache")
+    STATE_DIR = os.path.join(os.getcwd(), "timecard/state")
+    HISTORY_DB = os.path.join(os.getcwd(), "timecard/history.sqlite3")
 else:
     INPUT_DIR = os.path.join(os.getcwd(), "input")
     OUTPUT_DIR = os.path.join(os.getcwd(), "output")
+    CACHE_DIR = os.path.join(os.getcwd(), "cache")
+    STATE_DIR = os.path.join(os.getcwd(), "state")
+    HISTORY_DB = os.path.join(os.getcwd(), "history.sqlite3")
 
-CURRENT_YEAR = datetime.now().year  # TODO wont work with split year
+DETAIL_CHUNK_ROWS = 100_000
+OUTPUT_WORKERS = 4
+RECONCILE_TOLERANCE = 0.01  # hours
+# --ot-rules: overtime rules by the state code at the start of the payroll_info
+# Location ('CA (Remote)' -> 'CA'), in hours per workday / per Flockx week, None
+# where a rule doesn't apply. Locations without an entry get DEFAULT_LABOR_RULES.
+LABOR_RULES = {
+    # daily OT past 8h, double time past 12h, weekly OT past 40 regular hours,
+    # and the 7th consecutive workday of a week is OT up to 8h and double time after
+    'CA': {'daily_ot': 8, 'daily_dt': 12, 'weekly_ot': 40, 'seventh_day': True},
+    'FLSA': {'daily_ot': None, 'daily_dt': None, 'weekly_ot': 40, 'seventh_day': False},
+}
+DEFAULT_LABOR_RULES = 'FLSA'
+OUTPUT_BUFFER_BYTES = 1024 * 1024
+DETAIL_COLUMNS = ['Employee Number', 'Date', 'Reg Hours', 'OT Hours']
+INPUT_FILES = ['approved_hours', 'payroll_info', 'summary_hours']
+# inputs each output table is built from, the other outputs use all of INPUT_FILES
+OUTPUT_INPUTS = {'summary_hours': {'summary_hours', 'payroll_info'},
+                 'detail_hours': {'approved_hours', 'payroll_info'}}
+DETAIL_PATTERN = 'approved_hours.csv'  # --detail-files default
+DEDUPE_POLICIES = ['last', 'sum', 'error']
+READ_WORKERS = 8
+WATCH_DEBOUNCE = 2.0  # seconds the inputs must stay unchanged before a --watch run
+WATCH_POLL_SECONDS = 1.0
+# inotify events that can change an input: IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM,
+# IN_MOVED_TO, IN_CREATE, IN_DELETE
+INOTIFY_MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+SERVE_HOST = '127.0.0.1'  # --serve is for the local machine only
+SERVE_PORT = 8000
+# Layout of the input files: field -> (dtype, columns, required). Float
+# fields are the sum of their columns with blank cells read as 0. Missing
+# required columns are an error, missing optional ones are reported and
+# read as 0 (or '').
+INPUT_SCHEMAS = {
+    'approved_hours': {
+        'id': ('str', ['Employee Number'], True),
+        'date': ('str', ['Date'], True),
+        'hours': ('float', ['Reg Hours'], True),
+        'ot': ('float', ['OT Hours'], True),
+    },
+    'payroll_info': {
+        'id': ('str', ['Employee #'], True),
+        'hire_date': ('str', ['Hire Date'], True),
+        'name': ('str', ['Name'], True),
+        'title': ('str', ['Job Title'], True),
+        'location': ('str', ['Location'], True),
+        'schedule': ('str', ['Work Schedule'], True),
+        'status': ('str', ['Employment Status'], True),
+        'manager': ('str', ['Manager'], True),
+    },
+    'summary_hours': {
+        'id': ('str', ['Employee Number'], True),
+        'hours': ('float', ['Regular'], True),
+        'ot': ('float', ['Overtime'], True),
+        'holiday': ('float', ['Holiday'], False),
+        'pto': ('float', ['Paid Time Off'], False),
+        'personal': ('float', ['Personal Day'], False),
+        'sick': ('float', ['Sick Leave', 'Sick Leave (CA)'], False),
+        'other': ('float', ['Bereavement', 'Volunteer', 'Voting'], False),
+        'total_pto': ('float', ['Total PTO'], False),
+        'all_hrs': ('float', ['Total Hours'], False),
+        'approved': ('str', ['Approved?'], False),
+    },
+}
+# other names the same column goes by in payroll exports
+COLUMN_ALIASES = {
+    'Employee Number': ['Employee #', 'Employee ID'],
+    'Employee #': ['Employee Number', 'Employee ID'],
+    'Reg Hours': ['Regular Hours'],
+    'OT Hours': ['Overtime Hours'],
+    'Paid Time Off': ['PTO'],
+    'Total Hours': ['Total Hrs'],
+    'Approved?': ['Approved'],
+}
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SCHEMA = 11  # bump when the layout of cached stage results changes
+# below this total input size the stdlib csv path is used and pandas is never imported
+LIGHT_INPUT_BYTES = 2 * 1024 * 1024
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+PERIOD_DAYS = 14  # biweekly pay periods
 
-def read_csv_files():
-    timecard_detail_data = pd.read_csv(f"{INPUT_DIR}/approved_hours.csv", dtype=str)
-    payroll_info = pd.read_csv(f"{INPUT_DIR}/payroll_info.csv", dtype=str)
-    summary_hours = pd.read_csv(f"{INPUT_DIR}/summary_hours.csv", dtype=str)
+# Only blank cells are missing values, like on the stdlib path: pandas' default
+# markers ('n/a', 'NULL', ...) would otherwise be read as 0 hours without a word
+CSV_NA = {'keep_default_na': False, 'na_values': ['']}
+
+def read_input_csv(input_dir, name):
+    import pandas as pd
+    return pd.read_csv(f"{input_dir}/{name}.csv", dtype=str, **CSV_NA)
+
+def read_input_rows(input_dir, name):
+    """
+    Stdlib reader for the small-input path: the rows of an input file as
+    dicts, without importing pandas. Repeated column names get .1, .2, ...
+    suffixes like pd.read_csv gives them.
+    """
+    with open(f"{input_dir}/{name}.csv", encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header, seen = [], {}
+        for column in next(reader, []):
+            count = seen.get(column, 0)
+            seen[column] = count + 1
+            header.append(f"{column}.{count}" if count else column)
+        return [dict(zip(header, row + [''] * (len(header) - len(row))))
+                for row in reader if row]
+
+def read_csv_files(input_dir=INPUT_DIR):
+    timecard_detail_data = read_input_csv(input_dir, 'approved_hours')
+    payroll_info = read_input_csv(input_dir, 'payroll_info')
+    summary_hours = read_input_csv(input_dir, 'summary_hours')
     print("CSV files loaded.")
     return timecard_detail_data, payroll_info, summary_hours
 
-def get_iso_week_dates(year: int, week: int) -> tuple[date, date]:
+def read_csv_files_streaming(chunksize=DETAIL_CHUNK_ROWS, input_dir=INPUT_DIR):
+    """
+    Same as read_csv_files, but approved_hours.csv is not loaded eagerly.
+
+    Returns a chunk iterator for the detail file (only the columns the report
+    uses, hours already typed) next to the two small files.
+    """
+    timecard_detail_chunks = read_detail_chunks(input_dir, chunksize)
+    payroll_info = read_input_csv(input_dir, 'payroll_info')
+    summary_hours = read_input_csv(input_dir, 'summary_hours')
+    print("CSV files opened (streaming approved hours).")
+    return timecard_detail_chunks, payroll_info, summary_hours
+
+def read_detail_chunks(input_dir=INPUT_DIR, chunksize=DETAIL_CHUNK_ROWS, name='approved_hours'):
+    import pandas as pd
+    path = f"{input_dir}/{name}.csv"
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        columns = resolve_columns('approved_hours', next(csv.reader(f), []))
+    dtypes = {'Employee Number': str, 'Date': str, 'Reg Hours': 'float64', 'OT Hours': 'float64'}
+    reader = pd.read_csv(
+        path, usecols=[columns[column] for column in DETAIL_COLUMNS],
+        dtype={columns[column]: dtype for column, dtype in dtypes.items()},
+        float_precision='round_trip', chunksize=chunksize, **CSV_NA)
+    rename = {found: column for column, found in columns.items() if found != column}
+    return (chunk.rename(columns=rename) for chunk in reader) if rename else reader
+
+def detail_names(input_dir, pattern=DETAIL_PATTERN):
+    """
+    The approved_hours exports in input_dir matching the glob pattern, as
+    names for read_input_csv (file name without .csv), sorted so later
+    exports win under --dedupe last.
+    """
+    names = sorted(os.path.basename(path)[:-len('.csv')]
+                   for path in glob.glob(os.path.join(glob.escape(input_dir), pattern)))
+    if not names:
+        raise FileNotFoundError(f"No approved_hours export matching '{pattern}' in {input_dir}")
+    return names
+
+
+def read_detail_exports(input_dir, names, policy='last'):
+    """
+    Reads one or more approved_hours exports concurrently and merges them
+    with merge_detail_exports. A single export is returned as read.
+    """
+    if len(names) == 1:
+        return read_input_csv(input_dir, names[0])
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(READ_WORKERS, len(names))) as pool:
+        frames = list(pool.map(lambda name: read_input_csv(input_dir, name), names))
+    return merge_detail_exports(frames, policy)
+
+
+def merge_detail_exports(frames, policy='last'):
+    """
+    Concatenates approved_hours exports (in order) and resolves the
+    (Employee Number, Date) keys that appear in more than one of them:
+    'last' keeps the key's rows from the last export that has it, 'sum'
+    keeps the rows of every export so their Reg/OT hours add up, 'error'
+    raises listing the keys. Repeated keys within one export (several rows
+    for a day) are kept as exported.
+    """
+    import pandas as pd
+    df = pd.concat([conform_columns(frame, 'approved_hours').assign(_source=n)
+                    for n, frame in enumerate(frames)], ignore_index=True)
+    # keyed by the day the Date parses to, as in process_timecard_detail, so
+    # '2025-06-18' and '2025-06-18 00:00:00' from two exports are the same day
+    key = ['Employee Number', '_day']
+    df['_day'] = pd.to_datetime(df['Date'].str.split().str[0], format="%Y-%m-%d").dt.date
+    by_key = df.groupby(key, sort=False, dropna=False)['_source']
+    shared = by_key.transform('nunique') > 1
+    if policy == 'sum' or not shared.any():
+        return df.drop(columns=['_source', '_day'])
+
+    if policy == 'error':
+        conflicts = df.loc[shared, key].drop_duplicates()
+        examples = ', '.join(f"{emp} on {day}" for emp, day in conflicts.head(5).itertuples(index=False))
+        raise ValueError(f"{len(conflicts)} (Employee Number, Date) pair(s) appear in more than one "
+                         f"approved_hours export, e.g. {examples}; use --dedupe last or sum to merge them")
+    last = df['_source'] == by_key.transform('max')
+    return df[last].drop(columns=['_source', '_day']).reset_index(drop=True)
+
+
+def resolve_columns(name, header):
+    """
+    Finds the INPUT_SCHEMAS columns of input file name in its header, under
+    their own name or an alias. Missing optional columns are reported on the
+    console.
+
+    Returns:
+        dict: schema column -> header column (None for a missing optional column)
+
+    Raises:
+        ValueError: listing every missing required column, with the closest
+            header name when it looks renamed
+    """
+    found, missing = {}, []
+    for dtype, columns, required in INPUT_SCHEMAS[name].values():
+        for column in columns:
+            found[column] = next((candidate for candidate in [column] + COLUMN_ALIASES.get(column, [])
+                                  if candidate in header), None)
+            if found[column] is None:
+                close = difflib.get_close_matches(column, header, n=1)
+                problem = f"'{column}'" + (f" (renamed to '{close[0]}'?)" if close else "")
+                if required:
+                    missing.append(problem)
+                else:
+                    print(f"Note: {name}.csv has no {problem} column, reading it as "
+                          f"{'0' if dtype == 'float' else 'blank'}")
+    if missing:
+        raise ValueError(f"{name}.csv is missing column(s) {', '.join(missing)}; "
+                         f"found: {', '.join(map(str, header))}")
+    return found
+
+
+def conform_columns(df, name):
+    """df with the INPUT_SCHEMAS columns of input file name under their schema names."""
+    columns = resolve_columns(name, list(df.columns))
+    return df.rename(columns={found: column for column, found in columns.items()
+                              if found is not None and found != column})
+
+
+def apply_schema(data, name, lists=True):
     """
-    Returns the first (Monday) and last (Sunday) dates of a given ISO week.
+    Reads the INPUT_SCHEMAS fields of input file name from data (a DataFrame
+    or the dicts from read_input_rows), one whole column at a time: float
+    fields are typed with pd.to_numeric (blank cells read as 0) and summed
+    across their columns, str fields are passed through (blank cells read as
+    '', like the csv module reads them).
 
     Args:
-        year (int): The ISO year (e.g., 2025)
-        week (int): The ISO week number (1–53)
+        lists (bool): False keeps the fields of a DataFrame as Series
 
     Returns:
-        tuple: (first_day: date, last_day: date)
+        dict: field -> list of values, one per row
+    """
+    is_frame = hasattr(data, 'columns')
+    if not is_frame and not data:
+        return {field: [] for field in INPUT_SCHEMAS[name]}
+    columns = resolve_columns(name, list(data.columns) if is_frame else list(data[0]))
+    if is_frame:
+        import pandas as pd
+
+    fields = {}
+    for field, (dtype, names, _) in INPUT_SCHEMAS[name].items():
+        present = [columns[column] for column in names if columns[column] is not None]
+        if dtype == 'float':
+            if is_frame:
+                values = sum(pd.to_numeric(data[column]).fillna(0).astype('float64')
+                             for column in present) if present else \
+                    pd.Series(0.0, index=data.index)
+                fields[field] = values.tolist() if lists else values
+            else:
+                fields[field] = [float(sum(get_float(row[column]) for column in present))
+                                 for row in data]
+        elif present:
+            if is_frame:
+                values = data[present[0]].fillna('')
+                fields[field] = values.tolist() if lists else values
+            else:
+                fields[field] = [row[present[0]] for row in data]
+        else:
+            fields[field] = [''] * len(data) if lists or not is_frame else \
+                pd.Series('', index=data.index, dtype=object)
+    return fields
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def exports_digest(input_dir, names, policy):
+    """Cache key part for the merged approved_hours exports: their digests plus the policy."""
+    if len(names) == 1:
+        return file_digest(f"{input_dir}/{names[0]}.csv")
+    digest = hashlib.blake2b(digest_size=20)
+    for name in names:
+        digest.update(f"{name}:{file_digest(f'{input_dir}/{name}.csv')};".encode())
+    digest.update(policy.encode())
+    return digest.hexdigest()
+
+def input_digests(input_dir, names, policy):
+    """Digest of each input file of a period, the approved_hours exports as one."""
+    return {'approved_hours': exports_digest(input_dir, names, policy),
+            **{name: file_digest(f"{input_dir}/{name}.csv") for name in INPUT_FILES[1:]}}
+
+def cache_path(stage, digests, cache_dir=CACHE_DIR):
+    """Cache entries are keyed by tool VERSION, stage name and input file hashes."""
+    key = hashlib.blake2b('|'.join([VERSION, str(CACHE_SCHEMA), stage] + digests).encode(),
+                          digest_size=20)
+    return os.path.join(cache_dir, f"{stage}-{key.hexdigest()}.pkl")
+
+def cache_evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Drops least recently used entries until the cache fits in max_bytes.
+    Other --batch workers write and evict the same directory, so their
+    in-progress .tmp files are left alone and an entry that disappears
+    between listing and removing it is skipped.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(cache_dir, name)
+        with contextlib.suppress(FileNotFoundError):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    size = sum(entry[1] for entry in entries)
+    for _, entry_size, path in sorted(entries):
+        if size <= max_bytes:
+            break
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        size -= entry_size
+
+def cached_stage(digests, stage, names, compute, cache_dir=CACHE_DIR):
+    """
+    Returns compute() for a pipeline stage, reusing the pickled result of an
+    earlier run when the input files in names hash the same. digests is None
+    when caching is off (--no-cache). A hit refreshes the entry's mtime, which
+    is what LRU eviction goes by.
+    """
+    if digests is None:
+        return compute()
+    path = cache_path(stage, [digests[name] for name in names], cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+        os.utime(path)
+        print(f"Cache hit: {stage}")
+        return value
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    value = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    cache_evict(cache_dir)
+    return value
+
+def pay_calendar(first_day, last_day, anchor=None, period_days=PERIOD_DAYS):
+    """
+    Precomputes the week math for every day in the input span once, so the
+    rest of the pipeline only does array lookups (index = day - first_day).
+
+    Flockx weeks run Sunday to Saturday. The absolute week of a day ordinal
+    is day // 7 (ordinals that are multiples of 7 are Sundays), so weeks
+    keep counting across New Year. Relative period weeks start at 1 in the
+    week of first_day, or with anchor (the first Sunday of any biweekly pay
+    period) at the period boundary on or before first_day.
+
+    Args:
+        first_day (int): first day ordinal of the input, None when it is empty
+        last_day (int): last day ordinal of the input
+        anchor (date): optional first day of a pay period
+
+    Returns:
+        dict: first_day, start_week (absolute week of period week 1),
+              period_start / period_end (date), and per day of the span
+              'week' (absolute), 'period_week' (relative) and 'label'
+              (YYYY-MM-DD), plus 'week_dates': {period_week: (sunday, saturday)}
+    """
+    if first_day is None:
+        return {'first_day': 0, 'start_week': 0, 'period_start': 'NONE', 'period_end': 'NONE',
+                'week': [], 'period_week': [], 'label': [], 'week_dates': {}}
+    if anchor is None:
+        period_start = first_day - first_day % 7
+    else:
+        period_start = first_day - (first_day - anchor.toordinal()) % period_days
+    start_week = period_start // 7
+
+    days = range(first_day, last_day + 1)
+    week = [day // 7 for day in days]
+    period_week = [w - start_week + 1 for w in week]
+    week_dates = {
+        w - start_week + 1: (date.fromordinal(w * 7), date.fromordinal(w * 7 + 6))
+        for w in range(week[0], week[-1] + 1)}
+    return {
+        'first_day': first_day,
+        'start_week': start_week,
+        'period_start': date.fromordinal(period_start),
+        'period_end': date.fromordinal(period_start + period_days - 1),
+        'week': week,
+        'period_week': period_week,
+        'label': [format_day(day) for day in days],
+        'week_dates': week_dates,
+    }
+
+
+def format_day(day):
+    """Day ordinal as the YYYY-MM-DD string used in the reports."""
+    return date.fromordinal(day).isoformat()
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' (as returned for min_date/max_date) as a day ordinal, 'NONE' as None."""
+    return None if value == 'NONE' else date.fromisoformat(value).toordinal()
+
+
+def map_days(days, fn, dtype=object):
+    """
+    fn applied to every day ordinal in the days array, calling fn once per
+    distinct day since a period only spans a few weeks of them.
     """
-    # ISO weekday: Monday=1, Sunday=7
-    first_day = date.fromisocalendar(year, week, 1) - timedelta(days=1)
-    last_day = first_day + timedelta(days=6)
-    return first_day, last_day
+    import numpy as np
+    unique, inverse = np.unique(np.asarray(days), return_inverse=True)
+    return np.array([fn(int(day)) for day in unique], dtype=dtype)[inverse]
+
+
+def intern_value(value):
+    """sys.intern for strings, other values (NaN for blank cells) unchanged."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def is_blank(value):
+    """True for '' and for the NaN pandas reads empty cells as."""
+    return value is None or value != value or value == ''
 
 def get_float(str):
-    return float(str) if pd.notna(str) and str != '' else 0
+    return float(str) if not is_blank(str) else 0
 
 def process_payroll_info(df):
-    info = {}
-    for row in df.to_dict('records'):
-        emp_id = row['Employee #']
-        info[emp_id] = {
-            "hire_date": row['Hire Date'],
-            "name": row['Name'],
-            "title": row['Job Title'],
-            "location": row['Location'],
-            "schedule": row['Work Schedule'],
-            "status": row['Employment Status'],
-            "manager": row['Manager'],
-        }
-    return info
+    """
+    Builds the employee directory from the payroll_info rows: the ids, an
+    id -> position map and one column per INFO_FIELDS attribute, with the
+    strings interned since titles, locations and managers repeat. One extra
+    position past the last employee holds '*MISSING*' in every field, so an
+    unknown id resolves to a position like any other.
+
+    Returns:
+        dict: {'ids': list, 'index': {id: position}, field: list, ...}
+    """
+    fields = apply_schema(df, 'payroll_info')
+    directory = {'ids': [], 'index': {}}
+    directory.update((field, []) for field in INFO_FIELDS)
+    for row, emp_id in enumerate(fields['id']):
+        emp_id = intern_value(emp_id)
+        position = directory['index'].setdefault(emp_id, len(directory['ids']))
+        if position == len(directory['ids']):
+            directory['ids'].append(emp_id)
+            for field in INFO_FIELDS:
+                directory[field].append(intern_value(fields[field][row]))
+        else:
+            # a repeated id keeps its last row
+            for field in INFO_FIELDS:
+                directory[field][position] = intern_value(fields[field][row])
+    for field in INFO_FIELDS:
+        directory[field].append(MISSING)
+    return directory
+
+
+def employee_positions(directory, ids):
+    """Directory positions for a batch of employee ids, unknown ids get the '*MISSING*' one."""
+    index, missing = directory['index'], len(directory['ids'])
+    return [index.get(id, missing) for id in ids]
+
+
+def missing_employees(directory, summary_ids, detail_ids):
+    """
+    Employee ids that are in summary_hours or approved_hours but not in
+    payroll_info, in order of first appearance.
+
+    Returns:
+        list: (id, in summary_hours: bool, in approved_hours: bool) per id
+    """
+    index, detail_ids = directory['index'], set(detail_ids)
+    missing = {id: (id, True, id in detail_ids) for id in summary_ids if id not in index}
+    for id in detail_ids.difference(index, missing):
+        missing[id] = (id, False, True)
+    return list(missing.values())
 
 
 def process_timecard_detail(df):
-    timecard_detail = {}
-    start_week, min_day, max_day = 52, 20301231, 0
+    """
+    Parses the approved_hours rows into parallel typed columns: int32
+    employee code and day ordinal, float64 reg/OT hours. Codes index the
+    'ids' table of Employee Number values exactly as exported ('0140' and
+    'E140' stay what they are, they are the key into the other two files).
+    Dates are only formatted again when the report is rendered.
+
+    Returns:
+        tuple: (detail: dict of array.array plus 'ids' list, min_date: str, max_date: str)
+    """
+    fields = apply_schema(df, 'approved_hours')
+    codes = {}
+    detail = {'id': array('i', [codes.setdefault(id, len(codes)) for id in fields['id']]),
+              'ids': list(codes), 'day': array('i'),
+              'hours': array('d', fields['hours']), 'ot': array('d', fields['ot'])}
+    days = {}  # each distinct Date value is parsed once
+
+    for value in fields['date']:
+        day = days.get(value)
+        if day is None:
+            day = days[value] = datetime.strptime(value.split()[0], "%Y-%m-%d").toordinal()
+        detail['day'].append(day)
+
+    if not days:
+        return detail, 'NONE', 'NONE'
+    return detail, format_day(min(detail['day'])), format_day(max(detail['day']))
+
+
+def process_timecard_detail_columnar(df):
+    """
+    Columnar version of process_timecard_detail.
+
+    Parses the whole Date column at once instead of walking the rows, and
+    returns the same typed columns as a DataFrame, with the ids as a
+    Categorical (int codes plus the table of exported id strings). Fields are read through the same
+    approved_hours schema, so unparseable hours are an error on both paths.
+
+    Returns:
+        tuple: (detail: DataFrame, min_date: str, max_date: str)
+    """
+    import numpy as np
+    import pandas as pd
+    fields = apply_schema(df, 'approved_hours', lists=False)
+    dates = pd.to_datetime(fields['date'].str.split().str[0], format="%Y-%m-%d")
+    days = dates.to_numpy().astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+
+    detail = pd.DataFrame({
+        'id': pd.Categorical(fields['id']),
+        'day': days.astype(np.int32),
+        'hours': fields['hours'].to_numpy(),
+        'ot': fields['ot'].to_numpy(),
+    })
+
+    if detail.empty:
+        return detail, 'NONE', 'NONE'
+    return detail, format_day(int(days.min())), format_day(int(days.max()))
+
+
+def process_timecard_detail_chunks(chunks):
+    """
+    Streaming version of process_timecard_detail_columnar.
+
+    Each chunk is typed as it arrives, so only the compact typed detail is
+    kept in memory instead of the raw string frame. Totals are left to
+    aggregate_report, which adds up the kept rows like the eager path does.
+
+    Returns:
+        tuple: (detail: DataFrame, min_date: str, max_date: str)
+    """
+    import pandas as pd
+    details = []
     min_date, max_date = 'NONE', 'NONE'
 
-    for idx, row in enumerate(df.to_dict('records')):
-        date_obj = datetime.strptime(row['Date'].split()[0], "%Y-%m-%d").date()
-        # since Flockx starts work week one day earlier, calculate week # for one
-        # day later
-        one_day_later = date_obj + timedelta(days=1)
-        week = one_day_later.isocalendar()[1]
-        date_code = date_obj.year * 10000 + date_obj.month * 100 + date_obj.day
-
-        start_week = min(start_week, week)
-        if date_code < min_day:
-            min_day, min_date = date_code, date_obj.strftime("%Y-%m-%d")
-        if date_code > max_day:
-            max_day, max_date = date_code, date_obj.strftime("%Y-%m-%d")
-
-        timecard_detail[idx] = {
-            'id': row['Employee Number'],
-            'hours': float(row['Reg Hours']) if pd.notna(row['Reg Hours']) and
-                row['Reg Hours'] != '' else 0,
-            'date': date_obj.strftime("%Y-%m-%d"),
-            'month': date_obj.month,
-            'day': date_obj.day,
-            'week': week + 1,
-            'year': date_obj.year,
-            'ot': float(row['OT Hours']) if pd.notna(row['OT Hours']) and
-                row['OT Hours'] != '' else 0
-        }
+    for chunk in chunks:
+        detail, chunk_min, chunk_max = process_timecard_detail_columnar(chunk)
+        if detail.empty:
+            continue
+        details.append(detail)
+
+        # dates are ISO formatted so string compare is date compare
+        if min_date == 'NONE' or chunk_min < min_date:
+            min_date = chunk_min
+        if max_date == 'NONE' or chunk_max > max_date:
+            max_date = chunk_max
+
+    if not details:
+        return process_timecard_detail_columnar(pd.DataFrame(columns=DETAIL_COLUMNS, dtype=str))
+
+    return concat_details(details).reset_index(drop=True), min_date, max_date
+
+
+def concat_details(frames):
+    """
+    pd.concat of processed detail frames. Their id categories differ, which
+    would turn the column back into strings, so the categories are unioned.
+    """
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+    ids = union_categoricals([frame['id'] for frame in frames])
+    detail = pd.concat([frame.drop(columns='id') for frame in frames])
+    detail.insert(0, 'id', ids)
+    return detail
+
+
+def process_timecard_detail_incremental(df, state):
+    """
+    Incremental version of process_timecard_detail_columnar for an
+    approved_hours.csv that is re-exported during the period.
+
+    Rows are matched to the previous run by (employee, date, occurrence) and
+    compared by a hash of their raw values, so only new or corrected rows are
+    parsed. Corrected and deleted rows replace or drop their stored rows, and
+    aggregate_report adds the totals up again from the merged detail.
+
+    Args:
+        state (dict): what the previous run returned, or None for a first run
+
+    Returns:
+        tuple: ((detail, min_date, max_date), new_state, counts)
+    """
+    import numpy as np
+    import pandas as pd
+    raw = conform_columns(df, 'approved_hours')[DETAIL_COLUMNS].reset_index(drop=True)
+    fingerprints = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    occurrence = raw.groupby(['Employee Number', 'Date'], sort=False, dropna=False).cumcount()
+    keys = pd.util.hash_pandas_object(
+        raw[['Employee Number', 'Date']].assign(occurrence=occurrence), index=False).to_numpy()
+
+    if state is None or (state.get('version'), state.get('schema')) != (VERSION, CACHE_SCHEMA):
+        state = {'keys': np.array([], dtype='uint64'), 'fingerprints': np.array([], dtype='uint64'),
+                 'detail': None, 'high_water': None}
+
+    prev_pos = pd.Index(state['keys']).get_indexer(keys)
+    matched = prev_pos >= 0
+    unchanged = matched.copy()
+    unchanged[matched] = state['fingerprints'][prev_pos[matched]] == fingerprints[matched]
+    changed = matched & ~unchanged
+
+    parsed, _, _ = process_timecard_detail_columnar(raw.loc[~unchanged])
+    if state['detail'] is not None:
+        kept = state['detail'].iloc[prev_pos[unchanged]]
+        detail = concat_details([kept.set_axis(np.flatnonzero(unchanged)),
+                                 parsed.set_axis(np.flatnonzero(~unchanged))]).sort_index()
+        detail = detail.reset_index(drop=True)
+    else:
+        detail = parsed.reset_index(drop=True)
+
+    if detail.empty:
+        min_date, max_date = 'NONE', 'NONE'
+    else:
+        days = detail['day'].to_numpy()
+        min_date, max_date = format_day(int(days.min())), format_day(int(days.max()))
+
+    high_water = state['high_water']
+    counts = {
+        'unchanged': int(unchanged.sum()),
+        'corrected': int(changed.sum()),
+        'new': int((~matched).sum()),
+        'removed': int(len(state['keys']) - matched.sum()),
+        'after_high_water': int(
+            (detail['day'] > date.fromisoformat(high_water['date']).toordinal()).sum())
+        if high_water and not detail.empty else len(detail),
+    }
+    new_state = {
+        'version': VERSION,
+        'schema': CACHE_SCHEMA,
+        'keys': keys,
+        'fingerprints': fingerprints,
+        'detail': detail,
+        'high_water': {'date': max_date,
+                       'fingerprint': int(fingerprints[-1]) if len(fingerprints) else None},
+    }
+    return (detail, min_date, max_date), new_state, counts
+
 
-        # Compute Period Start / End based on min_date
+def state_path(input_dir, state_dir=STATE_DIR):
+    key = hashlib.blake2b(os.path.abspath(input_dir).encode(), digest_size=10)
+    return os.path.join(state_dir, f"incremental-{key.hexdigest()}.pkl")
 
-    return timecard_detail, min_date, max_date, start_week
+
+def load_incremental_state(input_dir, state_dir=STATE_DIR):
+    try:
+        with open(state_path(input_dir, state_dir), 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def save_incremental_state(input_dir, state, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    path = state_path(input_dir, state_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
 
 
 def process_summary_hours(df):
-    timecard_summary = {}
-    # zero out the data structure
+    """
+    Summary hours per employee id, typed column by column through the
+    summary_hours schema, plus the column totals.
+
+    Returns:
+        tuple: (timecard_summary: {id: record}, total: {column: sum})
+    """
+    fields = apply_schema(df, 'summary_hours')
     summary_cols = ['hours', 'ot', 'holiday', 'pto', 'personal',
                     'sick', 'other', 'total_pto', 'all_hrs']
-    total = {key: 0 for key in summary_cols}
-
-    for row in df.to_dict('records'):
-        id = row['Employee Number']
-        fields = [
-            get_float(row.get('Regular', 0)),
-            get_float(row.get('Overtime', 0)),
-            get_float(row.get('Holiday', 0)),
-            get_float(row.get('Paid Time Off}', 0)),
-            get_float(row.get('Personal Day', 0)),
-            get_float(row.get('Sick Leave', 0)) + get_float(row.get('Sick Leave (CA)', 0)),
-            get_float(row.get('Bereavement', 0)) + get_float(row.get('Volunteer', 0)) + get_float(row.get('Voting', 0)),
-            get_float(row.get('Total PTO', 0)),
-            get_float(row.get('Total Hours', 0)),
-        ]
+    total = {key: sum(fields[key]) for key in summary_cols}
 
-        fields = [float(f) if pd.notna(f) and f != '' else 0 for f in fields]
-        approved = row.get('Approved?', '')
-        keys = summary_cols
-        print(keys)
-        print(fields)
-        record = dict(zip(keys, fields))
+    timecard_summary = {}
+    for id, approved, *values in zip(fields['id'], fields['approved'],
+                                     *(fields[key] for key in summary_cols)):
+        record = dict(zip(summary_cols, values))
         record['total_hrs'] = (record['hours'] + record['ot'] +
             record['holiday'] + record['personal'] + record['sick'] +
             record['other'] + record['pto'])
         record['approved'] = approved
-
-        for key in total.keys():
-            if key in record:
-                total[key] += record[key]
-
         timecard_summary[id] = record
 
     return timecard_summary, total
 
 
-def create_report(info, timecard_summary, timecard_detail, total, start_date, end_date, start_week):
-    headers = ['Work Schedule', 'Emp Status', 'Location', 'Employee Name', 'Manager', 'Reg Hrs', 'OT Hrs', 'Hol Hrs', 'Pers Hrs']
-    headers += ['Sick Hrs', 'Other PTO', 'Total PTO', 'Total Hrs', 'Approved?']
-
-    # Compute Work Period from start_week
-    per_start, unused = get_iso_week_dates(CURRENT_YEAR, start_week)
-    unused, per_end = get_iso_week_dates(CURRENT_YEAR, start_week + 1)
-
-    csv_lines = [','.join(headers)]
-    html_rows = []
-
-    for id, summary in timecard_summary.items():
-        emp_info = info.get(id, {key: '*MISSING*' for key in ['schedule', 'status', 'location', 'name', 'manager']})
-        row = [
-            emp_info.get('schedule', '*MISSING*'),
-            emp_info.get('status', '*MISSING*'),
-            emp_info.get('location', '*MISSING*'),
-            f'"{emp_info.get("name", "*MISSING*")}"',
-            emp_info.get('manager', '*MISSING*'),
-            f"{summary['hours']:.2f}",
-            f"{summary['ot']:.2f}",
-            f"{summary['holiday']:.2f}",
-            f"{summary['personal']:.2f}",
-            f"{summary['sick']:.2f}",
-            f"{summary['other']:.2f}",
-            f"{summary['pto']:.2f}",
-            f"{summary['total_hrs']:.2f}",
-            summary['approved']
-        ]
-        csv_lines.append(','.join(row))
-        html_row = ''.join(f"<td>{escape(str(cell))}</td>" for cell in row)
-        html_rows.append(f"<tr>{html_row}</tr>")
+SUMMARY_HEADERS = ['Work Schedule', 'Emp Status', 'Location', 'Employee Name', 'Manager', 'Reg Hrs', 'OT Hrs', 'Hol Hrs', 'Pers Hrs',
+                   'Sick Hrs', 'Other PTO', 'Total PTO', 'Total Hrs', 'Approved?']
+DETAIL_HEADERS = ['Emp #', 'Employee Name', 'Week', 'Date',
+                  'Reg Hrs', 'OT Hrs', 'Total Hours']
+INFO_FIELDS = ['hire_date', 'name', 'title', 'location', 'schedule', 'status', 'manager']
+MISSING = '*MISSING*'
+MISSING_HEADERS = ['Emp #', 'In summary_hours', 'In approved_hours']
+OT_CHECK_HEADERS = ['Emp #', 'Employee Name', 'Location', 'Rules', 'Week', 'Worked Hrs',
+                    'Exported Reg Hrs', 'Exported OT Hrs', 'Expected Reg Hrs', 'Expected OT Hrs',
+                    'Expected DT Hrs', 'OT Diff']
+RECONCILE_HEADERS = ['Emp #', 'Employee Name', 'Detail Reg Hrs', 'Summary Reg Hrs', 'Reg Diff',
+                     'Detail OT Hrs', 'Summary OT Hrs', 'OT Diff']
 
-    style_section = """
+STYLE_SECTION = """
     <style>
       table { border-collapse: collapse; }
       th, td {
@@ -181,169 +777,1986 @@ def create_report(info, timecard_summary, timecard_detail, total, start_date, en
     </style>
     """
 
-    summary_table_html = f"""
-    <h1>Timecard Report</h1>
-    <h3>Hours Reported: {start_date} - {end_date}</h3>
-    <table border="1" cellpadding="5">
-      <tr>{''.join(f'<th>{h}</th>' for h in headers)}</tr>
-      {''.join(html_rows)}
-    </table>
+
+def join_payroll_info(directory, ids):
+    """
+    Looks up the payroll info columns for a batch of employee ids in one
+    indexed join. Ids that are not in payroll_info get '*MISSING*' in every
+    field.
     """
+    import numpy as np
+    import pandas as pd
+    # get_indexer gives -1 for unknown ids, which picks the trailing MISSING row
+    positions = pd.Index(directory['ids'], dtype=object).get_indexer(ids)
+    return pd.DataFrame({field: np.array(directory[field], dtype=object)[positions]
+                         for field in INFO_FIELDS}, index=ids)
 
-    from collections import defaultdict
-
-    # First group timecard detail entries by employee name and then by week
-    name_week_grouped_details = defaultdict(lambda: defaultdict(list))
-    for _, record in timecard_detail.items():
-        emp_id = record['id']
-        emp_name = info.get(emp_id, {}).get('name', '*MISSING*')
-        week_num = record['week'] - start_week  # Relative week number
-        record['name'] = emp_name
-        name_week_grouped_details[emp_name][week_num].append(record)
-
-    # Generate one detail table per employee, split by week
-    detail_tables_by_name_week = []
-    detail_headers = ['Emp #', 'Employee Name', 'Week', 'Date',
-                      'Reg Hrs', 'OT Hrs', 'Total Hours']
-    detailed_csv_file = [','.join(detail_headers)]
-
-    for emp_name, week_groups in name_week_grouped_details.items():
-        # Initialize employee-wide totals
-        emp_reg_total = 0
-        emp_ot_total = 0
-        emp_sick_total = 0
-        emp_total_total = 0
-
-        for week_num in sorted(week_groups):
-            rows_html = []
-            # Initialize totals per week
-            reg_total = 0
-            ot_total = 0
-            sick_total = 0
-            total_total = 0
-
-            for record in week_groups[week_num]:
-                reg_hours = record['hours']
-                ot_hours = record['ot']
-                sick_hours = record.get('sick', 0) + record.get('sick_ca', 0)
-                total_hours = reg_hours + ot_hours + sick_hours
-
-                # Add to week totals
-                reg_total += reg_hours
-                ot_total += ot_hours
-                sick_total += sick_hours
-                total_total += total_hours
-
-                # Also add to employee totals
-                emp_reg_total += reg_hours
-                emp_ot_total += ot_hours
-                emp_sick_total += sick_hours
-                emp_total_total += total_hours
-
-                row = [
-                    record['id'],
-                    emp_name,
-                    week_num,
-                    record['date'],
-                    f"{reg_hours:.2f}",
-                    f"{ot_hours:.2f}",
-                    f"{total_hours:.2f}"
-                ]
-                html_row = ''.join(
-                    f"<td>{escape(str(cell))}</td>" for cell in row)
-                rows_html.append(f"<tr>{html_row}</tr>")
-                detailed_csv_file.append(','.join(f'"{cell}"' for cell in row))
-
-            # Add a TOTAL row for the week
-            total_row = [
-                '', '', '', 'TOTAL:',
-                f"{reg_total:.2f}",
-                f"{ot_total:.2f}",
-                f"{total_total:.2f}"
-            ]
-            total_html_row = ''.join(
-                f"<td><strong>{escape(str(cell))}</strong></td>" for cell in
-                total_row)
-            rows_html.append(f"<tr>{total_html_row}</tr>")
-
-            wk_start, week_end = get_iso_week_dates(CURRENT_YEAR, week_num + start_week - 1)
-            table_html = f"""
-            <h2>{escape(emp_name)} – Week {week_num} [{wk_start} - {week_end}]</h2>
-            <table>
-              <tr>{''.join(f'<th>{h}</th>' for h in detail_headers)}</tr>
-              {''.join(rows_html)}
-            </table><br>
-            """
-            detail_tables_by_name_week.append(table_html)
 
-        # After all weeks for this employee, add an EMPLOYEE GRAND TOTAL table
-        grand_total_html = f"""
-        <h2>{escape(emp_name)} – Payroll Period Total [{per_start} - {per_end}]</h2>
-        <table>
-          <tr>{''.join(f'<th>{h}</th>' for h in detail_headers)}</tr>
-          <tr>
-            <td></td><td>{escape(emp_name)}</td><td></td><td><strong>TOTAL:</strong></td>
-            <td><strong>{emp_reg_total:.2f}</strong></td>
-            <td><strong>{emp_ot_total:.2f}</strong></td>
-            <td><strong>{emp_total_total:.2f}</strong></td>
-          </tr>
-        </table><br>
-        """
-        detail_tables_by_name_week.append(grand_total_html)
+def group_sums(values, starts):
+    """
+    Sums of the runs values[starts[i]:starts[i + 1]], each added up row by
+    row from the left like aggregate_report_light does. numpy's sum adds
+    pairwise, which rounds differently at .xx5, so instead the rows are
+    added one position at a time across all the runs still going.
+    """
+    import numpy as np
+    lengths = np.diff(np.r_[starts, len(values)]).astype(np.int64)
+    sums = np.zeros(len(starts))
+    running = np.arange(len(starts))
+    for offset in range(int(lengths.max()) if len(starts) else 0):
+        running = running[lengths[running] > offset]
+        sums[running] += values[starts[running] + offset]
+    return sums
 
-    detail_table_html = f"""
-    <h1>Timecard Details by Employee and Week</h1>
-    <h3>Work Period: {per_start} - {per_end}</h3>
-    {''.join(detail_tables_by_name_week)}
+
+def aggregate_report(info, timecard_summary, timecard_detail, start_date, end_date,
+                     anchor=None):
+    """
+    Aggregation stage behind create_report.
+
+    Groups the detail once by (employee id, relative week), joins employee
+    names from the payroll directory by index and returns everything the renderers
+    need as a dict. Grouping is by id, so two employees with the same name
+    stay separate.
+
+    Args:
+        anchor (date): optional first day of a biweekly pay period, see pay_calendar
+    """
+    import numpy as np
+    import pandas as pd
+    summary_ids = pd.Index(list(timecard_summary.keys()), dtype=object)
+    summary_info = join_payroll_info(info, summary_ids)
+    summary_rows = [
+        (schedule, status, location, name, manager, summary['hours'],
+         summary['ot'], summary['holiday'], summary['personal'], summary['sick'],
+         summary['other'], summary['pto'], summary['total_hrs'], summary['approved'])
+        for schedule, status, location, name, manager, summary in zip(
+            summary_info['schedule'], summary_info['status'],
+            summary_info['location'], summary_info['name'],
+            summary_info['manager'], timecard_summary.values())
+    ]
+
+    # employees are numbered in order of first appearance in the detail
+    emp_codes, emp_ids = pd.factorize(timecard_detail['id'])
+    emp_ids = pd.Index(list(emp_ids), dtype=object)
+    names = join_payroll_info(info, emp_ids)['name']
+
+    calendar = pay_calendar(parse_day(start_date), parse_day(end_date), anchor)
+    day = timecard_detail['day'].to_numpy()
+    detail = pd.DataFrame({
+        'emp': emp_codes,
+        'week': np.asarray(calendar['period_week'], dtype=np.int32)[day - calendar['first_day']],
+        'day': day,
+        'hours': timecard_detail['hours'].to_numpy(),
+        'ot': timecard_detail['ot'].to_numpy(),
+    })
+    detail['total'] = detail['hours'] + detail['ot']
+    detail = detail.sort_values(['emp', 'week'], kind='stable', ignore_index=True)
+
+    emp = detail['emp'].to_numpy()
+    week = detail['week'].to_numpy()
+    group_starts = np.flatnonzero(
+        np.r_[True, (emp[1:] != emp[:-1]) | (week[1:] != week[:-1])]) if len(detail) \
+        else np.array([], dtype=int)
+    groups = pd.MultiIndex.from_arrays([emp[group_starts], week[group_starts]],
+                                       names=['emp', 'week'])
+
+    week_sums = pd.DataFrame({column: group_sums(detail[column].to_numpy(), group_starts)
+                              for column in ['hours', 'ot', 'total']}, index=groups)
+    # employee totals from the rows too, summing the week sums would round differently
+    emp_starts = group_starts[np.r_[True, emp[group_starts[1:]] != emp[group_starts[:-1]]]] \
+        if len(detail) else group_starts
+    emp_sums = pd.DataFrame({column: group_sums(detail[column].to_numpy(), emp_starts)
+                             for column in ['hours', 'ot', 'total']})
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'calendar': calendar,
+        'per_start': calendar['period_start'],
+        'per_end': calendar['period_end'],
+        'summary': summary_rows,
+        'summary_ids': list(summary_ids),
+        'employees': list(zip(emp_ids, names)),
+        'missing_employees': missing_employees(info, summary_ids, emp_ids),
+        'detail': detail,
+        'group_starts': group_starts,
+        'week_totals': list(week_sums.itertuples(name=None)),
+        'emp_totals': list(emp_sums.itertuples(index=False, name=None)),
+        'directory': info,
+    }
+
+
+def aggregate_report_light(info, timecard_summary, timecard_detail, start_date, end_date,
+                           anchor=None):
+    """
+    Stdlib version of aggregate_report for the small-input path, working on
+    the array columns from process_timecard_detail. Returns the same dict
+    with plain lists in place of frames, so pandas is never imported.
+    """
+    summary_rows = []
+    for pos, summary in zip(employee_positions(info, timecard_summary),
+                            timecard_summary.values()):
+        summary_rows.append((
+            info['schedule'][pos], info['status'][pos], info['location'][pos],
+            info['name'][pos], info['manager'][pos], summary['hours'], summary['ot'],
+            summary['holiday'], summary['personal'], summary['sick'], summary['other'],
+            summary['pto'], summary['total_hrs'], summary['approved']))
+
+    calendar = pay_calendar(parse_day(start_date), parse_day(end_date), anchor)
+    period_week, first_day = calendar['period_week'], calendar['first_day']
+    # employees are numbered in order of first appearance in the detail
+    emp_codes, groups = {}, {}
+    ids = timecard_detail['ids']
+    for code, day, hours, ot in zip(timecard_detail['id'], timecard_detail['day'],
+                                    timecard_detail['hours'], timecard_detail['ot']):
+        emp = emp_codes.setdefault(ids[code], len(emp_codes))
+        groups.setdefault((emp, period_week[day - first_day]), []).append((day, hours, ot))
+
+    detail = {key: [] for key in ['emp', 'week', 'day', 'hours', 'ot', 'total']}
+    group_starts, week_totals, emp_totals = [], [], []
+    for emp, week_num in sorted(groups):
+        if emp == len(emp_totals):
+            emp_totals.append([0, 0, 0])
+        group_starts.append(len(detail['day']))
+        week_total = [0, 0, 0]
+        for day, hours, ot in groups[emp, week_num]:
+            row = (emp, week_num, day, hours, ot, hours + ot)
+            for key, value in zip(detail, row):
+                detail[key].append(value)
+            for totals in (week_total, emp_totals[emp]):
+                totals[0] += row[3]
+                totals[1] += row[4]
+                totals[2] += row[5]
+        week_totals.append(((emp, week_num), *week_total))
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'calendar': calendar,
+        'per_start': calendar['period_start'],
+        'per_end': calendar['period_end'],
+        'summary': summary_rows,
+        'summary_ids': list(timecard_summary),
+        'employees': [(id, info['name'][pos])
+                      for id, pos in zip(emp_codes, employee_positions(info, emp_codes))],
+        'missing_employees': missing_employees(info, timecard_summary, emp_codes),
+        'detail': detail,
+        'group_starts': group_starts,
+        'week_totals': week_totals,
+        'emp_totals': [tuple(totals) for totals in emp_totals],
+        'directory': info,
+    }
+
+
+def exceeds_tolerance(diff, tolerance):
+    """Whether an hours diff (a number or a Series of them) is more than tolerance off."""
+    # the 1e-9 keeps float noise on a diff of exactly tolerance from counting
+    return abs(diff) > tolerance + 1e-9
+
+
+def reconcile_hours(report, tolerance=RECONCILE_TOLERANCE):
+    """
+    Checks the approved_hours detail against summary_hours: each employee's
+    Reg/OT detail sums (already grouped in report['emp_totals']) are joined
+    to their summary Regular/Overtime in one outer join, employees missing
+    on either side counting as 0 hours there.
+
+    Returns:
+        list: RECONCILE_HEADERS rows for the employees that are off by more
+              than tolerance hours, in summary order
+    """
+    import pandas as pd
+    emp_ids, names = zip(*report['employees']) if report['employees'] else ((), ())
+    detail = pd.DataFrame([totals[:2] for totals in report['emp_totals']],
+                          columns=['detail_reg', 'detail_ot'], index=pd.Index(emp_ids, dtype=object))
+    detail['detail_name'] = list(names)
+    summary = pd.DataFrame([(row[3], row[5], row[6]) for row in report['summary']],
+                           columns=['name', 'summary_reg', 'summary_ot'],
+                           index=pd.Index(report['summary_ids'], dtype=object))
+
+    joined = pd.concat([summary, detail], axis=1, sort=False)
+    hours = joined[['detail_reg', 'summary_reg', 'detail_ot', 'summary_ot']].fillna(0)
+    hours['reg_diff'] = hours['detail_reg'] - hours['summary_reg']
+    hours['ot_diff'] = hours['detail_ot'] - hours['summary_ot']
+    off = exceeds_tolerance(hours['reg_diff'], tolerance) | exceeds_tolerance(hours['ot_diff'], tolerance)
+    names = joined['name'].fillna(joined['detail_name'])[off]
+    hours = hours[off]
+    return list(zip(hours.index, names, hours['detail_reg'], hours['summary_reg'],
+                    hours['reg_diff'], hours['detail_ot'], hours['summary_ot'], hours['ot_diff']))
+
+
+def reconcile_hours_light(report, tolerance=RECONCILE_TOLERANCE):
+    """Stdlib version of reconcile_hours for the small-input path."""
+    detail = {id: (name, totals[0], totals[1])
+              for (id, name), totals in zip(report['employees'], report['emp_totals'])}
+    summary = {id: (row[3], row[5], row[6])
+               for id, row in zip(report['summary_ids'], report['summary'])}
+    rows = []
+    for id in list(summary) + [id for id in detail if id not in summary]:
+        name, summary_reg, summary_ot = summary.get(id, (None, 0, 0))
+        detail_name, detail_reg, detail_ot = detail.get(id, (None, 0, 0))
+        reg_diff, ot_diff = detail_reg - summary_reg, detail_ot - summary_ot
+        if exceeds_tolerance(reg_diff, tolerance) or exceeds_tolerance(ot_diff, tolerance):
+            rows.append((id, detail_name if name is None else name, detail_reg, summary_reg,
+                         reg_diff, detail_ot, summary_ot, ot_diff))
+    return rows
+
+
+def labor_rules_name(location):
+    """The LABOR_RULES entry for a payroll_info Location, e.g. 'CA (Remote)' -> 'CA'."""
+    state = str(location).split('(')[0].strip().upper()
+    return state if state in LABOR_RULES else DEFAULT_LABOR_RULES
+
+
+def check_overtime(report, tolerance=RECONCILE_TOLERANCE):
+    """
+    Recomputes regular, overtime and double-time hours per employee and
+    Flockx week from the hours worked each day (Reg + OT Hours), under the
+    LABOR_RULES for the employee's Location, and compares them with the
+    exported OT Hours. Everything is array arithmetic plus a groupby
+    cumsum over the whole detail, in day order:
+
+    1. daily: hours past daily_dt are double time, hours past daily_ot OT
+    2. 7th day: when all 7 days of a week were worked, the Saturday is OT up
+       to daily_ot and double time past it
+    3. weekly: regular hours past weekly_ot in the week become OT
+
+    Returns:
+        list: OT_CHECK_HEADERS rows for the employee-weeks where exported OT
+              differs from expected OT + double time by more than tolerance
+    """
+    import numpy as np
+    import pandas as pd
+    detail = report['detail']
+    # one row per employee and day, sorted, so cumsum runs in day order
+    days = pd.DataFrame({key: detail[key] for key in ['emp', 'week', 'day', 'hours', 'ot']}) \
+        .groupby(['emp', 'week', 'day'], sort=True).sum().reset_index()
+
+    ids = [str(emp_id) for emp_id, _ in report['employees']]
+    directory = report['directory']
+    locations = [directory['location'][pos] for pos in employee_positions(directory, ids)]
+    names = [labor_rules_name(location) for location in locations]
+    rules = pd.DataFrame([LABOR_RULES[name] for name in names],
+                         columns=['daily_ot', 'daily_dt', 'weekly_ot', 'seventh_day'])
+    rules = rules.astype('float64').fillna(np.inf).to_numpy()[days['emp'].to_numpy()] \
+        if len(rules) else np.empty((0, 4))
+    daily_ot, daily_dt, weekly_ot, seventh_day = rules.T
+
+    worked = (days['hours'] + days['ot']).to_numpy()
+    dt = np.clip(worked - daily_dt, 0, None)
+    ot = np.clip(np.minimum(worked, daily_dt) - daily_ot, 0, None)
+    reg = worked - ot - dt
+
+    week_key = [days['emp'], days['week']]
+    worked_days = (days['hours'] + days['ot'] > 0).groupby(week_key).transform('sum').to_numpy()
+    seventh = (seventh_day == 1) & (worked_days == 7) & (days['day'].to_numpy() % 7 == 6)
+    ot = np.where(seventh, np.minimum(worked, daily_ot), ot)
+    dt = np.where(seventh, np.clip(worked - daily_ot, 0, None), dt)
+    reg = np.where(seventh, 0, reg)
+
+    cum = pd.Series(reg).groupby(week_key).cumsum().to_numpy()
+    over = np.clip(cum - weekly_ot, 0, None) - np.clip(cum - reg - weekly_ot, 0, None)
+    days['worked'], days['reg'], days['exp_ot'], days['exp_dt'] = worked, reg - over, ot + over, dt
+
+    weeks = days.groupby(['emp', 'week'], sort=True)[
+        ['worked', 'hours', 'ot', 'reg', 'exp_ot', 'exp_dt']].sum()
+    weeks['diff'] = weeks['ot'] - weeks['exp_ot'] - weeks['exp_dt']
+    weeks = weeks[exceeds_tolerance(weeks['diff'], tolerance)]
+    return [(ids[emp], report['employees'][emp][1], locations[emp], names[emp], int(week), *hours)
+            for (emp, week), *hours in weeks.itertuples(name=None)]
+
+
+def iter_employee_weeks(report, groups=None):
     """
+    Walks the aggregated detail in report order.
+
+    Yields one (emp_id, name, weeks, emp_total) per employee, where weeks is a
+    list of (week_num, rows, week_total), rows are (date, reg, ot, total)
+    tuples and the totals are (reg, ot, total).
+
+    Args:
+        groups (range): optional span of report['week_totals'] to walk, e.g.
+            one employee's from employee_groups; only its rows are read
+    """
+    detail = report['detail']
+    labels, first_day = report['calendar']['label'], report['calendar']['first_day']
+    group_starts, week_totals = report['group_starts'], report['week_totals']
+    emp_totals = report['emp_totals']
+    if groups is None:
+        groups = range(len(week_totals))
+    end = group_starts[groups.stop] if groups.stop < len(group_starts) else len(detail['day'])
+    bounds = list(group_starts[groups.start:groups.stop]) + [end]
+    span = slice(bounds[0], end)
+    rows = zip((labels[day - first_day] for day in column_slice(detail['day'], span)),
+               column_slice(detail['hours'], span), column_slice(detail['ot'], span),
+               column_slice(detail['total'], span))
+
+    group = groups.start
+    while group < groups.stop:
+        emp = week_totals[group][0][0]
+        weeks = []
+        while group < groups.stop and week_totals[group][0][0] == emp:
+            (_, week_num), reg, ot, total = week_totals[group]
+            size = bounds[group - groups.start + 1] - bounds[group - groups.start]
+            weeks.append((week_num, list(islice(rows, size)), (reg, ot, total)))
+            group += 1
+        emp_id, name = report['employees'][emp]
+        yield emp_id, name, weeks, emp_totals[emp]
+
+
+def column_slice(column, span):
+    """Positional slice of a detail column, a Series (pandas path) or a list (light path)."""
+    return column.iloc[span] if hasattr(column, 'iloc') else column[span]
+
+
+def employee_groups(report):
+    """
+    Index into report['week_totals']: employee id -> range of that
+    employee's week groups, for iter_employee_weeks(report, groups).
+    """
+    spans = {}
+    for group, ((emp, _), *_) in enumerate(report['week_totals']):
+        spans.setdefault(emp, [group, group])[1] = group + 1
+    return {str(report['employees'][emp][0]): range(first, stop)
+            for emp, (first, stop) in spans.items()}
+
+
+def write_summary_csv(f, report):
+    """Writes the summary table with csv.writer (RFC 4180 quoting) to an open file."""
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(SUMMARY_HEADERS)
+    for row in report['summary']:
+        writer.writerow(row[:5] + tuple(f"{value:.2f}" for value in row[5:-1]) + row[-1:])
+
+
+def write_detail_csv(f, report):
+    """Writes the detail rows with csv.writer (RFC 4180 quoting) to an open file."""
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(DETAIL_HEADERS)
+    for emp_id, emp_name, weeks, _ in iter_employee_weeks(report):
+        for week_num, rows, _ in weeks:
+            writer.writerows(
+                (emp_id, emp_name, week_num, date_str,
+                 f"{reg_hours:.2f}", f"{ot_hours:.2f}", f"{total_hours:.2f}")
+                for date_str, reg_hours, ot_hours, total_hours in rows)
+
+
+def write_missing_csv(f, report):
+    """Writes the ids missing from payroll_info and which inputs they came from."""
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(MISSING_HEADERS)
+    writer.writerows((id, 'Yes' if in_summary else 'No', 'Yes' if in_detail else 'No')
+                     for id, in_summary, in_detail in report['missing_employees'])
+
 
-    full_html = f"""
+def write_ot_check_csv(f, report):
+    """Writes the check_overtime employee-weeks whose exported OT is off."""
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(OT_CHECK_HEADERS)
+    writer.writerows(row[:5] + tuple(f"{value:.2f}" for value in row[5:])
+                     for row in report['ot_check'])
+
+
+def write_reconciliation_csv(f, report):
+    """Writes the detail vs summary_hours discrepancies from reconcile_hours."""
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(RECONCILE_HEADERS)
+    writer.writerows(row[:2] + tuple(f"{value:.2f}" for value in row[2:])
+                     for row in report['discrepancies'])
+
+
+def summary_frame(report):
+    import pandas as pd
+    return pd.DataFrame(report['summary'], columns=SUMMARY_HEADERS)
+
+
+def detail_frame(report):
+    """The report detail as one flat frame with the detail CSV columns."""
+    import numpy as np
+    import pandas as pd
+    detail, calendar = report['detail'], report['calendar']
+    emp_ids, names = zip(*report['employees']) if report['employees'] else ((), ())
+    emp = detail['emp'].to_numpy()
+    return pd.DataFrame({
+        'Emp #': np.array(emp_ids, dtype=object)[emp],
+        'Employee Name': np.array(names, dtype=object)[emp],
+        'Week': detail['week'],
+        'Date': np.asarray(calendar['label'], dtype=object)[
+            detail['day'].to_numpy() - calendar['first_day']],
+        'Reg Hrs': detail['hours'],
+        'OT Hrs': detail['ot'],
+        'Total Hours': detail['total'],
+    }, columns=DETAIL_HEADERS)
+
+
+def write_summary_csv_pandas(f, report):
+    """Same output as write_summary_csv, written in one go with DataFrame.to_csv."""
+    summary_frame(report).to_csv(f, index=False, float_format='%.2f', lineterminator='\n')
+
+
+def write_detail_csv_pandas(f, report):
+    """Same output as write_detail_csv, written in one go with DataFrame.to_csv."""
+    detail_frame(report).to_csv(f, index=False, float_format='%.2f', lineterminator='\n')
+
+
+CSV_WRITERS = {
+    'csv': (write_summary_csv, write_detail_csv),
+    'pandas': (write_summary_csv_pandas, write_detail_csv_pandas),
+}
+
+
+def render_summary_csv(report):
+    buf = io.StringIO()
+    write_summary_csv(buf, report)
+    return buf.getvalue()
+
+
+def render_detail_csv(report):
+    buf = io.StringIO()
+    write_detail_csv(buf, report)
+    return buf.getvalue()
+
+
+# Precompiled templates for the streamed HTML report. The whitespace matches
+# the original f-string layout so the document is unchanged byte for byte.
+HTML_HEAD = """
     <!DOCTYPE html>
     <html>
     <head>
     <meta charset="UTF-8">
     <title>Timecard Report</title>
-    {style_section}
+    """ + STYLE_SECTION + """
     </head>
     <body>
     <font size="2" face="Arial" >
-    {summary_table_html}<br>{detail_table_html}
+    """
+HTML_TAIL = """
     </body></html>
     """
+SUMMARY_TABLE_HEAD = ("""
+    <h1>Timecard Report</h1>
+    <h3>Hours Reported: {} - {}</h3>
+    <table border="1" cellpadding="5">
+      <tr>""" + ''.join(f'<th>{h}</th>' for h in SUMMARY_HEADERS) + """</tr>
+      """).format
+SUMMARY_ROW = ('<tr>' + '<td>{}</td>' * 5 + '<td>{:.2f}</td>' * 8 + '<td>{}</td></tr>').format
+SUMMARY_TABLE_TAIL = """
+    </table>
+    <br>"""
+DETAIL_TABLE_HEAD = """
+    <h1>Timecard Details by Employee and Week</h1>
+    <h3>Work Period: {} - {}</h3>
+    """.format
+WEEK_TABLE_HEAD = ("""
+            <h2>{} – Week {} [{} - {}]</h2>
+            <table>
+              <tr>""" + ''.join(f'<th>{h}</th>' for h in DETAIL_HEADERS) + """</tr>
+              """).format
+DETAIL_ROW = ('<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td>'
+              '<td>{:.2f}</td><td>{:.2f}</td><td>{:.2f}</td></tr>').format
+WEEK_TOTAL_ROW = ('<tr>' + '<td><strong></strong></td>' * 3 + '<td><strong>TOTAL:</strong></td>'
+                  '<td><strong>{:.2f}</strong></td><td><strong>{:.2f}</strong></td>'
+                  '<td><strong>{:.2f}</strong></td></tr>').format
+WEEK_TABLE_TAIL = """
+            </table><br>
+            """
+EMPLOYEE_TOTAL_TABLE = """
+        <h2>{0} – Payroll Period Total [{1} - {2}]</h2>
+        <table>
+          <tr>""" + ''.join(f'<th>{h}</th>' for h in DETAIL_HEADERS) + """</tr>
+          <tr>
+            <td></td><td>{0}</td><td></td><td><strong>TOTAL:</strong></td>
+            <td><strong>{3:.2f}</strong></td>
+            <td><strong>{4:.2f}</strong></td>
+            <td><strong>{5:.2f}</strong></td>
+          </tr>
+        </table><br>
+        """
+EMPLOYEE_TOTAL_TABLE = EMPLOYEE_TOTAL_TABLE.format
+DETAIL_TABLE_TAIL = """
+    """
+RECONCILE_TABLE_HEAD = ("""
+    <h1>Reconciliation: approved_hours vs summary_hours</h1>
+    <h3>Hours Reported: {} - {}</h3>
+    <p>{} employee(s) off by more than {:.2f} hours</p>
+    <table>
+      <tr>""" + ''.join(f'<th>{h}</th>' for h in RECONCILE_HEADERS) + """</tr>
+      """).format
+RECONCILE_ROW = ('<tr><td>{}</td><td>{}</td>' + '<td>{:.2f}</td>' * 6 + '</tr>').format
+RECONCILE_TABLE_TAIL = """
+    </table>"""
+
+# Extra pages of the --serve report server
+EMPLOYEE_INDEX_HEAD = """
+    <p><a href="/report">Full report</a> | <a href="/reconciliation">Reconciliation</a></p>
+    <h1>Employees</h1>
+    <table>
+      <tr><th>Emp #</th><th>Employee Name</th><th>Weeks</th></tr>
+      """
+EMPLOYEE_INDEX_ROW = ('<tr><td><a href="/employee/{0}">{1}</a></td><td>{2}</td>'
+                      '<td>{3}</td></tr>').format
+EMPLOYEE_WEEK_LINK = '<a href="/employee/{0}/week/{1}">Week {1}</a>'.format
+EMPLOYEE_INDEX_TAIL = """
+    </table>"""
 
-    return '\n'.join(csv_lines), full_html, '\n'.join(detailed_csv_file)
+# Index page of the --by-manager shards, linking to each manager's folder
+MANAGER_INDEX_HEAD = ("""
+    <h1>Timecard Reports by Manager</h1>
+    <h3>Hours Reported: {} - {}</h3>
+    <table border="1" cellpadding="5">
+      <tr><th>Manager</th><th>Employees</th><th>Reg Hrs</th><th>OT Hrs</th><th>Report</th>
+      <th>Summary</th><th>Detail</th></tr>
+      """).format
+MANAGER_INDEX_ROW = ('<tr><td>{0}</td><td>{1}</td><td>{2:.2f}</td><td>{3:.2f}</td>'
+                     '<td><a href="{4}/timecard_report_{5}.html">HTML</a></td>'
+                     '<td><a href="{4}/summary_hours_{5}.csv">CSV</a></td>'
+                     '<td><a href="{4}/detail_hours_{5}.csv">CSV</a></td></tr>').format
+MANAGER_INDEX_TAIL = """
+    </table>"""
 
 
-def write_file(filename, data):
+def make_escape_memo():
+    """
+    Returns an escape() that only escapes each distinct string once. Names,
+    ids and dates repeat on every detail row, so most calls are dict hits.
+    """
+    memo = {}
+
+    def escape_memo(value):
+        try:
+            return memo[value]
+        except KeyError:
+            memo[value] = escaped = escape(value)
+            return escaped
+    return escape_memo
+
+
+def write_html_report(f, report):
+    """
+    Streams the HTML report to an open file handle, one employee/week table at
+    a time, instead of building the whole document in memory.
+    """
+    esc = make_escape_memo()
+    f.write(HTML_HEAD)
+    write_summary_table(f, report, esc)
+    f.write(DETAIL_TABLE_HEAD(report['per_start'], report['per_end']))
+    write_employee_tables(f, report, iter_employee_weeks(report), esc)
+    f.write(DETAIL_TABLE_TAIL)
+    f.write(HTML_TAIL)
+
+
+def write_summary_table(f, report, esc=escape):
+    f.write(SUMMARY_TABLE_HEAD(report['start_date'], report['end_date']))
+    for row in report['summary']:
+        schedule, status, location, name, manager = row[:5]
+        f.write(SUMMARY_ROW(esc(str(schedule)), esc(str(status)), esc(str(location)),
+                            esc(f'"{name}"'), esc(str(manager)), *row[5:-1],
+                            esc(str(row[-1]))))
+    f.write(SUMMARY_TABLE_TAIL)
+
+
+def write_employee_tables(f, report, employees, esc=escape):
+    """
+    Writes one detail table per week and a payroll period total for each
+    (emp_id, name, weeks, emp_total) from iter_employee_weeks.
+    """
+    per_start, per_end = report['per_start'], report['per_end']
+    week_dates = report['calendar']['week_dates']
+    for emp_id, emp_name, weeks, emp_total in employees:
+        emp_id, emp_name = esc(str(emp_id)), esc(str(emp_name))
+        for week_num, rows, week_total in weeks:
+            wk_start, week_end = week_dates[week_num]
+            f.write(WEEK_TABLE_HEAD(emp_name, week_num, wk_start, week_end))
+            for date_str, reg_hours, ot_hours, total_hours in rows:
+                f.write(DETAIL_ROW(emp_id, emp_name, week_num, esc(date_str),
+                                   reg_hours, ot_hours, total_hours))
+            f.write(WEEK_TOTAL_ROW(*week_total))
+            f.write(WEEK_TABLE_TAIL)
+
+        # After all weeks for this employee, add an EMPLOYEE GRAND TOTAL table
+        if emp_total is not None:
+            f.write(EMPLOYEE_TOTAL_TABLE(emp_name, per_start, per_end, *emp_total))
+
+
+def write_employee_index(f, report, groups):
+    """Writes a table linking to each employee's --serve page and weeks."""
+    from urllib.parse import quote
+    week_totals = report['week_totals']
+    f.write(EMPLOYEE_INDEX_HEAD)
+    for emp_id, name in report['employees']:
+        emp_id = str(emp_id)
+        link = quote(emp_id)
+        weeks = ' '.join(EMPLOYEE_WEEK_LINK(link, week_totals[group][0][1])
+                         for group in groups[emp_id])
+        f.write(EMPLOYEE_INDEX_ROW(link, escape(emp_id), escape(str(name)), weeks))
+    f.write(EMPLOYEE_INDEX_TAIL)
+
+
+def write_reconciliation_html(f, report):
+    """Writes the reconcile_hours discrepancies as a standalone HTML page."""
+    discrepancies = report['discrepancies']
+    f.write(HTML_HEAD)
+    f.write(RECONCILE_TABLE_HEAD(report['start_date'], report['end_date'], len(discrepancies),
+                                 report['tolerance']))
+    for row in discrepancies:
+        f.write(RECONCILE_ROW(escape(str(row[0])), escape(str(row[1])), *row[2:]))
+    f.write(RECONCILE_TABLE_TAIL)
+    f.write(HTML_TAIL)
+
+
+def render_html(report):
+    buf = io.StringIO()
+    write_html_report(buf, report)
+    return buf.getvalue()
+
+
+def create_report(info, timecard_summary, timecard_detail, total, start_date, end_date,
+                  anchor=None):
+    report = aggregate_report(info, timecard_summary, timecard_detail, start_date,
+                              end_date, anchor)
+    return render_summary_csv(report), render_html(report), render_detail_csv(report)
+
+
+def report_written(filename):
+    # one write call, so lines from concurrent writers don't interleave
+    sys.stdout.write(f"Wrote file: {filename}\n")
+
+
+@contextlib.contextmanager
+def atomic_open(filename, mode="w", **kwargs):
+    """
+    Opens a temp file next to filename with a large write buffer (few round
+    trips on network drives) and renames it over filename once the block
+    finishes, so a partially written report is never left behind.
+    """
     os.makedirs(os.path.dirname(filename), exist_ok=True)
-    with open(filename, "w", encoding="utf-8") as f:
+    tmp_path = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, buffering=OUTPUT_BUFFER_BYTES, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def write_file(filename, data):
+    with atomic_open(filename, "w", encoding="utf-8") as f:
         f.write(data)
-    print(f"Wrote file: {filename}")
+    report_written(filename)
 
 
-def main():
-    timecard_detail_data, payroll_info, summary_hours = read_csv_files()
+def write_file_streamed(filename, writer, *args, newline=None):
+    """Like write_file, but lets writer(f, *args) stream into the open file."""
+    with atomic_open(filename, "w", encoding="utf-8", newline=newline) as f:
+        writer(f, *args)
+    report_written(filename)
 
-    info = process_payroll_info(payroll_info)
-    timecard_detail, start_date, end_date, start_week = process_timecard_detail(timecard_detail_data)
-    timecard_summary, total = process_summary_hours(summary_hours)
 
-    print(f'Timecard Script: Version {VERSION} [{VER_DATE}]')
-    print(f"Found {len(timecard_detail_data)} Timecard Records")
+# csv.writer does its own line endings
+write_csv_file = partial(write_file_streamed, newline='')
+
+
+TABLE_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet/Arrow output needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def id_column(ids):
+    """
+    Employee ids for a typed Arrow table: int64 when every id reads back
+    exactly as exported, otherwise the id strings, so ids like '0140' or
+    'E140' still join to payroll_info.
+
+    Returns:
+        tuple: (Series of ids, pyarrow type)
+    """
+    import pandas as pd
+    pa = import_pyarrow()
+    ids = pd.Series(ids, dtype=object).astype(str)
+    numbers = pd.to_numeric(ids, errors='coerce')
+    if numbers.notna().all() and (numbers.astype('int64').astype(str) == ids).all():
+        return numbers.astype('int64'), pa.int64()
+    return ids, pa.string()
+
+
+def summary_table(report):
+    """The summary table as a typed Arrow table (employee id, float hours), see id_column."""
+    pa = import_pyarrow()
+    frame = summary_frame(report)
+    ids, id_type = id_column(report['summary_ids'])
+    frame.insert(0, 'Emp #', ids.to_numpy())
+    schema = pa.schema([('Emp #', id_type)] +
+                       [(h, pa.string()) for h in SUMMARY_HEADERS[:5]] +
+                       [(h, pa.float64()) for h in SUMMARY_HEADERS[5:-1]] +
+                       [(SUMMARY_HEADERS[-1], pa.string())])
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def detail_table(report):
+    """The detail rows as a typed Arrow table (employee id, date32 date, float hours)."""
+    pa = import_pyarrow()
+    frame = detail_frame(report)
+    ids, id_type = id_column(frame['Emp #'])
+    frame['Emp #'] = ids.to_numpy()
+    frame['Date'] = map_days(report['detail']['day'], date.fromordinal)
+    schema = pa.schema([('Emp #', id_type), ('Employee Name', pa.string()),
+                        ('Week', pa.int32()), ('Date', pa.date32())] +
+                       [(h, pa.float64()) for h in DETAIL_HEADERS[4:]])
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def write_table_file(filename, table):
+    """Writes an Arrow table as Parquet or Arrow IPC, picked by the file extension."""
+    pa = import_pyarrow()
+    with atomic_open(filename, "wb") as f:
+        if filename.endswith(TABLE_FORMATS['parquet']):
+            import pyarrow.parquet as pq
+            pq.write_table(table, f)
+        else:
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+    report_written(filename)
+
+
+def render_table_file(filename, render, report):
+    """Renders a report table with render(report) and writes it with write_table_file."""
+    write_table_file(filename, render(report))
+
+
+def read_table_file(filename):
+    """Reads a summary/detail table written by write_table_file back as a typed DataFrame."""
+    pa = import_pyarrow()
+    if filename.endswith(TABLE_FORMATS['parquet']):
+        import pyarrow.parquet as pq
+        table = pq.read_table(filename)
+    else:
+        table = pa.ipc.open_file(filename).read_all()
+    return table.to_pandas()
+
+
+def read_period_tables(kind, fmt='parquet', output_dir=OUTPUT_DIR):
+    """
+    Loads every previously written <kind>_hours_<range> table in output_dir
+    into one frame, with the date range in a 'Period' column.
+
+    Args:
+        kind (str): 'summary' or 'detail'
+        fmt (str): 'parquet' or 'arrow'
+    """
+    import pandas as pd
+    prefix, ext = f"{kind}_hours_", TABLE_FORMATS[fmt]
+    frames = [
+        read_table_file(os.path.join(output_dir, name)).assign(
+            Period=name[len(prefix):-len(ext)])
+        for name in sorted(os.listdir(output_dir))
+        if name.startswith(prefix) and name.endswith(ext)
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def use_light_engine(args, input_dir):
+    """
+    Whether run_period can take the stdlib path: small inputs and only the
+    options it supports (plain CSV in, csv.writer CSV and HTML out).
+    """
+    if args.engine != 'auto':
+        return args.engine == 'light'
+    if args.stream or args.incremental or args.format != 'csv' or args.csv_engine != 'csv' \
+            or args.ot_rules:
+        return False
+    names = detail_names(input_dir, args.detail_files)
+    if len(names) > 1:
+        return False
+    size = sum(os.path.getsize(f"{input_dir}/{name}.csv") for name in names + INPUT_FILES[1:])
+    return size < LIGHT_INPUT_BYTES
+
+
+PROFILER = None  # stage records of the current --profile run, see start_profiling
+
+
+def start_profiling(cprofile=False):
+    global PROFILER
+    PROFILER = {'stages': [], 'cprofiles': {}, 'cprofile': cprofile}
+    tracemalloc.start()
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """
+    Records wall time, CPU time and the tracemalloc peak of the enclosed
+    pipeline stage while --profile is on (a no-op otherwise). The caller
+    can set 'rows' on the yielded record.
+    """
+    record = {'stage': name, 'rows': None}
+    if PROFILER is None:
+        yield record
+        return
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    profile = cProfile.Profile() if PROFILER['cprofile'] else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profile:
+        profile.enable()
+    try:
+        yield record
+    finally:
+        if profile:
+            profile.disable()
+            PROFILER['cprofiles'][name] = profile
+        record['wall'] = time.perf_counter() - wall
+        record['cpu'] = time.process_time() - cpu
+        record['peak_mb'] = (tracemalloc.get_traced_memory()[1] - base) / (1024 * 1024)
+        PROFILER['stages'].append(record)
+
+
+def run_stage(name, fn, *args, rows=None, **kwargs):
+    """
+    Calls fn(*args, **kwargs) as a named pipeline stage. rows defaults to the
+    length of the result for stages that return a frame, list or dict.
+    """
+    with profile_stage(name) as record:
+        result = fn(*args, **kwargs)
+        if rows is None and not isinstance(result, tuple) and hasattr(result, '__len__'):
+            rows = len(result)
+        record['rows'] = rows
+    return result
+
+
+def run_stages_concurrently(stages, workers=OUTPUT_WORKERS):
+    """
+    Runs independent stages, each a (name, fn, args, rows) tuple, in a thread
+    pool. Meant for the output writers, which mostly wait on file I/O. With
+    --profile (or a single worker) they run one after another so every
+    stage's timings and memory peak stay its own.
+    """
+    if PROFILER is not None or workers <= 1:
+        for name, fn, args, rows in stages:
+            run_stage(name, fn, *args, rows=rows)
+        return
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(stages))) as pool:
+        futures = [pool.submit(run_stage, name, fn, *args, rows=rows)
+                   for name, fn, args, rows in stages]
+    for future in futures:
+        future.result()
+
+
+def finish_profiling(output_dir, daterange):
+    """Prints the --profile table and writes the JSON sidecar (and .prof dump) next to the outputs."""
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    tracemalloc.stop()
+    stages = profiler['stages']
+
+    print(f"\n{'Stage':<36} {'Rows':>10} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak MB':>9}")
+    for record in stages:
+        rows = '' if record['rows'] is None else record['rows']
+        print(f"{record['stage']:<36} {rows:>10} {record['wall']:>9.3f} "
+              f"{record['cpu']:>9.3f} {record['peak_mb']:>9.1f}")
+    print(f"{'TOTAL':<36} {'':>10} {sum(r['wall'] for r in stages):>9.3f} "
+          f"{sum(r['cpu'] for r in stages):>9.3f}")
+
+    write_file(f"{output_dir}/profile_{daterange}.json", json.dumps({
+        'version': VERSION,
+        'daterange': daterange,
+        'stages': stages,
+    }, indent=2))
+
+    # the pandas import dwarfs every other stage on normal inputs and isn't our code
+    candidates = [record for record in stages if not record['stage'].startswith('import ')]
+    if profiler['cprofiles'] and candidates:
+        hottest = max(candidates, key=lambda record: record['wall'])['stage']
+        filename = f"{output_dir}/profile_{daterange}.prof"
+        profiler['cprofiles'][hottest].dump_stats(filename)
+        print(f"Wrote file: {filename} (cProfile of '{hottest}')")
+
+
+def run_period(args, input_dir=INPUT_DIR, output_dir=OUTPUT_DIR, changed=None):
+    """
+    Runs read -> process -> aggregate -> write for the period in input_dir.
+
+    Args:
+        changed (set): optional INPUT_FILES that changed since the last run
+            (--watch); outputs that exist and don't depend on them are kept
 
-    csv_summary_file, html_report, csv_detail_file  = create_report(info, timecard_summary,
-        timecard_detail, total, start_date, end_date, start_week)
+    Returns:
+        dict: run summary (date range, record count, employees, summary totals)
+    """
+    if args.profile:
+        start_profiling(args.cprofile)
+    report, total, records = build_report(args, input_dir)
+    result = write_period(args, output_dir, report, total, records, changed)
+    if args.history:
+        run_stage('store history', store_history, report, records, args.db, rows=records)
+    if args.profile:
+        finish_profiling(output_dir, result['daterange'])
+    return result
+
+
+def build_report(args, input_dir=INPUT_DIR):
+    """
+    Reads, processes, aggregates and reconciles the period in input_dir.
+
+    Returns:
+        tuple: (report, summary totals, detail record count)
+    """
+    if use_light_engine(args, input_dir):
+        report, total, records = load_period_light(args, input_dir)
+        reconcile = reconcile_hours_light
+    else:
+        report, total, records = load_period(args, input_dir)
+        reconcile = reconcile_hours
+    report['tolerance'] = args.tolerance
+    report['discrepancies'] = run_stage('reconcile_hours', reconcile, report, args.tolerance)
+    if args.ot_rules:
+        report['ot_check'] = run_stage('check_overtime', check_overtime, report, args.tolerance)
+    return report, total, records
+
+
+def load_period_light(args, input_dir):
+    """The stdlib path of run_period: read, process and aggregate without pandas."""
+    names = detail_names(input_dir, args.detail_files)
+    if len(names) > 1:
+        raise ValueError(f"--engine light reads a single approved_hours export, "
+                         f"'{args.detail_files}' matches {len(names)}")
+    detail_rows = run_stage('read approved_hours.csv', read_input_rows, input_dir, names[0])
+    payroll_rows = run_stage('read payroll_info.csv', read_input_rows, input_dir, 'payroll_info')
+    summary_rows = run_stage('read summary_hours.csv', read_input_rows, input_dir, 'summary_hours')
+
+    timecard_detail, start_date, end_date = run_stage(
+        'process_timecard_detail', process_timecard_detail, detail_rows, rows=len(detail_rows))
+    info = run_stage('process_payroll_info', process_payroll_info, payroll_rows, rows=len(payroll_rows))
+    timecard_summary, total = run_stage(
+        'process_summary_hours', process_summary_hours, summary_rows, rows=len(summary_rows))
+    report = run_stage('aggregate_report', aggregate_report_light, info, timecard_summary,
+                       timecard_detail, start_date, end_date, args.period_anchor,
+                       rows=len(timecard_detail['id']))
+    return report, total, len(timecard_detail['id'])
+
+
+def load_period(args, input_dir):
+    """
+    The pandas path of run_period: read, process and aggregate, reusing
+    cached stage results where the input files are unchanged.
+    """
+    # own stage so the import isn't billed to the first read
+    run_stage('import pandas', importlib.import_module, 'pandas')
+    names = detail_names(input_dir, args.detail_files)
+    digests = None if args.no_cache else input_digests(input_dir, names, args.dedupe)
+    mode = '-incremental' if args.incremental else '-stream' if args.stream else ''
+    anchor = f"-{args.period_anchor}" if args.period_anchor else ''
+
+    def read(name):
+        return run_stage(f"read {name}.csv", read_input_csv, input_dir, name)
+
+    def read_detail():
+        return run_stage('read approved_hours.csv', read_detail_exports, input_dir, names,
+                         args.dedupe)
+
+    def load_detail():
+        if args.incremental:
+            data = read_detail()
+            result, state, counts = run_stage(
+                'process_timecard_detail_incremental', process_timecard_detail_incremental,
+                data, load_incremental_state(input_dir), rows=len(data))
+            save_incremental_state(input_dir, state)
+            print(f"Incremental: {counts['new']} new, {counts['corrected']} corrected, "
+                  f"{counts['removed']} removed, {counts['unchanged']} unchanged rows "
+                  f"({counts['after_high_water']} after the last high-water mark)")
+            return result
+        if args.stream:
+            if len(names) > 1:
+                raise ValueError(f"--stream reads a single approved_hours export, "
+                                 f"'{args.detail_files}' matches {len(names)}")
+            with profile_stage('read+process_timecard_detail_chunks') as record:
+                result = process_timecard_detail_chunks(
+                    read_detail_chunks(input_dir, args.chunk_rows, names[0]))
+                record['rows'] = len(result[0])
+            return result
+        data = read_detail()
+        return run_stage('process_timecard_detail', process_timecard_detail_columnar, data,
+                         rows=len(data))
+
+    def load_payroll():
+        data = read('payroll_info')
+        return run_stage('process_payroll_info', process_payroll_info, data, rows=len(data))
+
+    def load_summary():
+        data = read('summary_hours')
+        return run_stage('process_summary_hours', process_summary_hours, data, rows=len(data))
+
+    def load_report():
+        if args.incremental:
+            # the incremental state plays the role of the cache for this stage
+            timecard_detail, start_date, end_date = load_detail()
+        else:
+            timecard_detail, start_date, end_date = cached_stage(
+                digests, 'detail' + mode, ['approved_hours'], load_detail)
+        info = cached_stage(digests, 'payroll', ['payroll_info'], load_payroll)
+        timecard_summary, total = cached_stage(digests, 'summary', ['summary_hours'], load_summary)
+        report = run_stage('aggregate_report', aggregate_report, info, timecard_summary,
+                           timecard_detail, start_date, end_date,
+                           args.period_anchor, rows=len(timecard_detail))
+        return report, total, len(timecard_detail)
+
+    return cached_stage(digests, 'report' + mode + anchor, INPUT_FILES, load_report)
+
+
+def write_period(args, output_dir, report, total, records, changed=None):
+    """
+    Writes the outputs for an aggregated period and returns its run summary.
+    With changed (see run_period) only the outputs that are out of date are written.
+    """
+    start_date, end_date = report['start_date'], report['end_date']
+
+    print(f'Timecard Script: Version {VERSION} [{VER_DATE}]')
+    print(f"Found {records} Timecard Records")
 
     daterange = f"{start_date}_to_{end_date}"
-    write_file(f"{OUTPUT_DIR}/summary_hours_{daterange}.csv", csv_summary_file)
-    write_file(f"{OUTPUT_DIR}/detail_hours_{daterange}.csv", csv_detail_file)
-    write_file(f"{OUTPUT_DIR}/timecard_report_{daterange}.html", html_report)
+    missing = report['missing_employees']
+    if missing:
+        print(f"WARNING: {len(missing)} employee id(s) not in payroll_info: "
+              f"{', '.join(str(id) for id, _, _ in missing)} "
+              f"(see missing_employees_{daterange}.csv)")
+    print_discrepancies(report, f"reconciliation_{daterange}.csv")
+    if 'ot_check' in report:
+        print_ot_check(report, f"ot_check_{daterange}.csv")
+
+    summary_rows, detail_rows = len(report['summary']), records
+    if args.format == 'csv':
+        write_summary, write_detail = CSV_WRITERS[args.csv_engine]
+        tables = [
+            ('render+write summary_hours.csv', write_csv_file,
+             (f"{output_dir}/summary_hours_{daterange}.csv", write_summary, report),
+             summary_rows),
+            ('render+write detail_hours.csv', write_csv_file,
+             (f"{output_dir}/detail_hours_{daterange}.csv", write_detail, report),
+             detail_rows),
+        ]
+    else:
+        ext = TABLE_FORMATS[args.format]
+        tables = [
+            (f"render+write summary_hours{ext}", render_table_file,
+             (f"{output_dir}/summary_hours_{daterange}{ext}", summary_table, report),
+             summary_rows),
+            (f"render+write detail_hours{ext}", render_table_file,
+             (f"{output_dir}/detail_hours_{daterange}{ext}", detail_table, report),
+             detail_rows),
+        ]
+    stages = tables + [
+        ('render+write timecard_report.html', write_file_streamed,
+         (f"{output_dir}/timecard_report_{daterange}.html", write_html_report, report),
+         detail_rows),
+        ('render+write missing_employees.csv', write_csv_file,
+         (f"{output_dir}/missing_employees_{daterange}.csv", write_missing_csv, report),
+         len(missing)),
+        ('render+write reconciliation.csv', write_csv_file,
+         (f"{output_dir}/reconciliation_{daterange}.csv", write_reconciliation_csv, report),
+         len(report['discrepancies'])),
+        ('render+write reconciliation.html', write_file_streamed,
+         (f"{output_dir}/reconciliation_{daterange}.html", write_reconciliation_html, report),
+         len(report['discrepancies'])),
+    ]
+    if 'ot_check' in report:
+        stages.append(('render+write ot_check.csv', write_csv_file,
+                       (f"{output_dir}/ot_check_{daterange}.csv", write_ot_check_csv, report),
+                       len(report['ot_check'])))
+    if changed is not None:
+        stages = stale_outputs(stages, changed, daterange)
+    # the report is only read from here on, so the outputs can be written in parallel
+    run_stages_concurrently(stages, args.output_workers)
+    if args.by_manager:
+        run_stage('render+write manager reports', write_manager_shards, args, output_dir, report,
+                  daterange, rows=detail_rows)
 
+    return {
+        'daterange': daterange,
+        'records': records,
+        'employees': len(report['employees']),
+        'missing': len(missing),
+        'discrepancies': len(report['discrepancies']),
+        'total': total,
+    }
+
+
+def stale_outputs(stages, changed, daterange):
+    """
+    The write stages whose output file is missing or built from a changed
+    input. Files are named <output>_<daterange><ext>, see OUTPUT_INPUTS.
+    """
+    stale = []
+    for stage in stages:
+        filename = stage[2][0]
+        output = os.path.basename(filename).rsplit(f"_{daterange}", 1)[0]
+        if not os.path.exists(filename) or changed & OUTPUT_INPUTS.get(output, set(INPUT_FILES)):
+            stale.append(stage)
+    if len(stale) < len(stages):
+        print(f"Kept {len(stages) - len(stale)} output(s) whose inputs didn't change")
+    return stale
+
+
+def manager_shards(report):
+    """
+    Partitions report by the payroll_info Manager of each employee (summary
+    and detail alike, '*MISSING*' for ids not in payroll_info) into one
+    report per manager. A shard has the keys the CSV and HTML writers read,
+    with its detail as plain lists, and is renumbered so it can be rendered
+    on its own.
+
+    Returns:
+        dict: manager -> report
+    """
+    directory = report['directory']
+    shared = {key: report[key] for key in ['start_date', 'end_date', 'calendar',
+                                            'per_start', 'per_end']}
+    shards = {}
+
+    def shard_of(manager):
+        if manager not in shards:
+            shards[manager] = dict(
+                shared, summary=[], summary_ids=[], employees=[], group_starts=[],
+                week_totals=[], emp_totals=[],
+                detail={key: [] for key in ['emp', 'week', 'day', 'hours', 'ot', 'total']})
+        return shards[manager]
+
+    for emp_id, row in zip(report['summary_ids'], report['summary']):
+        shard = shard_of(row[4])
+        shard['summary'].append(row)
+        shard['summary_ids'].append(emp_id)
+
+    detail = report['detail']
+    columns = {key: column_list(detail[key]) for key in ['week', 'day', 'hours', 'ot', 'total']}
+    starts = list(report['group_starts']) + [len(columns['day'])]
+    week_totals, groups = report['week_totals'], employee_groups(report)
+    ids = [str(emp_id) for emp_id, _ in report['employees']]
+    for code, pos in enumerate(employee_positions(directory, ids)):
+        shard = shard_of(directory['manager'][pos])
+        emp, rows = len(shard['employees']), shard['detail']
+        shard['employees'].append(report['employees'][code])
+        shard['emp_totals'].append(report['emp_totals'][code])
+        for group in groups.get(ids[code], ()):
+            (_, week_num), *totals = week_totals[group]
+            shard['group_starts'].append(len(rows['day']))
+            shard['week_totals'].append(((emp, week_num), *totals))
+            for key, column in columns.items():
+                rows[key].extend(column[starts[group]:starts[group + 1]])
+            rows['emp'].extend([emp] * (starts[group + 1] - starts[group]))
+    return shards
+
+
+def manager_folders(managers):
+    """Folder name per manager: the name reduced to [A-Za-z0-9_], numbered if two collide."""
+    folders, taken = {}, set()
+    for manager in sorted(managers):
+        base = '_'.join(''.join(c if c.isalnum() else ' ' for c in manager).split()) or 'manager'
+        folder, n = base, 1
+        while folder.lower() in taken:
+            n += 1
+            folder = f"{base}_{n}"
+        taken.add(folder.lower())
+        folders[manager] = folder
+    return folders
+
+
+def render_manager_shard(shard, shard_dir, daterange):
+    """Writes one manager's summary CSV, detail CSV and HTML report into shard_dir."""
+    for filename, writer, newline in [
+            (f"summary_hours_{daterange}.csv", write_summary_csv, ''),
+            (f"detail_hours_{daterange}.csv", write_detail_csv, ''),
+            (f"timecard_report_{daterange}.html", write_html_report, None)]:
+        with atomic_open(os.path.join(shard_dir, filename), "w", encoding="utf-8",
+                         newline=newline) as f:
+            writer(f, shard)
+
+
+def write_manager_shards(args, output_dir, report, daterange):
+    """
+    --by-manager: renders every manager_shards report into its own folder of
+    output_dir/managers_<range>/ in a process pool, plus an index.html
+    linking to them. A digest of each shard is kept in shards.json and
+    shards that are unchanged since the last run are not rendered again.
+
+    Returns:
+        tuple: (shards rendered, shards unchanged)
+    """
+    import multiprocessing
+    import shutil
+    from concurrent.futures import ProcessPoolExecutor
+
+    root = os.path.join(output_dir, f"managers_{daterange}")
+    manifest_path = os.path.join(root, 'shards.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    shards = manager_shards(report)
+    folders = manager_folders(shards)
+    digests, stale = {}, []
+    for manager, shard in shards.items():
+        folder = folders[manager]
+        # JSON rather than pickle: pickles of equal data differ with object sharing,
+        # e.g. between a fresh and a cached report. The calendar follows from the rest.
+        content = json.dumps([VERSION, {key: value for key, value in shard.items()
+                                        if key != 'calendar'}], default=str)
+        digests[folder] = hashlib.blake2b(content.encode(), digest_size=20).hexdigest()
+        files = [f"summary_hours_{daterange}.csv", f"detail_hours_{daterange}.csv",
+                 f"timecard_report_{daterange}.html"]
+        if manifest.get(folder, {}).get('digest') != digests[folder] or \
+                not all(os.path.exists(os.path.join(root, folder, name)) for name in files):
+            stale.append(manager)
+
+    render = [(shards[manager], os.path.join(root, folders[manager]), daterange)
+              for manager in stale]
+    # inside a --batch worker the periods already keep every core busy
+    if len(render) <= 1 or args.workers == 1 or multiprocessing.parent_process() is not None:
+        for shard_args in render:
+            render_manager_shard(*shard_args)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for future in [pool.submit(render_manager_shard, *shard_args) for shard_args in render]:
+                future.result()
+
+    # folders of managers that are no longer in the period
+    for folder in set(manifest) - set(digests):
+        shutil.rmtree(os.path.join(root, folder), ignore_errors=True)
+
+    with atomic_open(os.path.join(root, 'index.html'), "w", encoding="utf-8") as f:
+        f.write(HTML_HEAD)
+        f.write(MANAGER_INDEX_HEAD(report['start_date'], report['end_date']))
+        for manager in sorted(shards):
+            shard = shards[manager]
+            employees = len(set(map(str, shard['summary_ids'])) |
+                            {str(emp_id) for emp_id, _ in shard['employees']})
+            f.write(MANAGER_INDEX_ROW(escape(manager), employees,
+                                      sum(row[5] for row in shard['summary']),
+                                      sum(row[6] for row in shard['summary']),
+                                      folders[manager], daterange))
+        f.write(MANAGER_INDEX_TAIL)
+        f.write(HTML_TAIL)
+    with atomic_open(manifest_path, "w") as f:
+        json.dump({folders[manager]: {'manager': manager, 'digest': digests[folders[manager]]}
+                   for manager in sorted(shards)}, f, indent=1)
+    print(f"Wrote {len(render)} manager report(s), {len(shards) - len(render)} unchanged: "
+          f"{os.path.join(root, 'index.html')}")
+    return len(render), len(shards) - len(render)
+
+
+def print_discrepancies(report, filename, limit=20):
+    """Prints the reconcile_hours discrepancies (the first limit of them) to the console."""
+    discrepancies, tolerance = report['discrepancies'], report['tolerance']
+    if not discrepancies:
+        print(f"Reconciliation: detail matches summary_hours within {tolerance:.2f} hours "
+              f"for every employee")
+        return
+    print(f"WARNING: {len(discrepancies)} employee(s) where approved_hours detail differs from "
+          f"summary_hours by more than {tolerance:.2f} hours (see {filename}):")
+    print(f"{'Emp #':<8} {'Employee Name':<30} {'Detail Reg':>10} {'Summ Reg':>10} "
+          f"{'Detail OT':>10} {'Summ OT':>10}")
+    for id, name, detail_reg, summary_reg, _, detail_ot, summary_ot, _ in discrepancies[:limit]:
+        print(f"{str(id):<8} {str(name)[:30]:<30} {detail_reg:>10.2f} {summary_reg:>10.2f} "
+              f"{detail_ot:>10.2f} {summary_ot:>10.2f}")
+    if len(discrepancies) > limit:
+        print(f"... and {len(discrepancies) - limit} more")
+
+
+def print_ot_check(report, filename, limit=20):
+    """Prints the check_overtime employee-weeks (the first limit of them) to the console."""
+    ot_check, tolerance = report['ot_check'], report['tolerance']
+    if not ot_check:
+        print(f"Overtime check: exported OT matches the labor rules within {tolerance:.2f} hours "
+              f"for every employee and week")
+        return
+    print(f"WARNING: {len(ot_check)} employee-week(s) where the exported OT differs from the "
+          f"labor rules by more than {tolerance:.2f} hours (see {filename}):")
+    print(f"{'Emp #':<8} {'Employee Name':<30} {'Rules':<5} {'Week':>4} {'Worked':>8} "
+          f"{'Exp OT':>8} {'OT':>8} {'DT':>8}")
+    for id, name, _, rules, week, worked, _, exported_ot, _, ot, dt, _ in ot_check[:limit]:
+        print(f"{str(id):<8} {str(name)[:30]:<30} {rules:<5} {week:>4} {worked:>8.2f} "
+              f"{exported_ot:>8.2f} {ot:>8.2f} {dt:>8.2f}")
+    if len(ot_check) > limit:
+        print(f"... and {len(ot_check) - limit} more")
+
+
+def print_totals(total):
     print(f"\nTOTAL HOURS:")
     for key in total.keys():
         if total[key] > 0:
             print(f"{key}: {total[key]:.1f}")
 
 
+def find_period_dirs(input_root, pattern=DETAIL_PATTERN):
+    """Every directory below input_root that holds an approved_hours export matching pattern."""
+    return sorted(
+        dirpath for dirpath, _, filenames in os.walk(input_root)
+        if dirpath != input_root and fnmatch.filter(filenames, pattern)
+    )
+
+
+def run_batch_period(args, input_dir, output_dir):
+    """
+    Process pool worker for one period. The period's console output is
+    captured and returned with its run summary so periods don't interleave.
+    """
+    log = io.StringIO()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(log):
+            result = run_period(args, input_dir, output_dir)
+        result['status'] = 'ok'
+    except Exception as e:
+        result = {'daterange': '', 'records': 0, 'employees': 0, 'missing': 0,
+                  'discrepancies': 0, 'total': {},
+                  'status': f"FAILED: {type(e).__name__}: {e}"}
+    result['seconds'] = time.perf_counter() - started
+    result['log'] = log.getvalue()
+    return result
+
+
+def run_batch(args):
+    """
+    Processes every period directory under the input root in a process pool.
+    Each period writes into its own subfolder of OUTPUT_DIR, named after the
+    period directory (input/April -> output/April).
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    input_root = args.input_root
+    periods = find_period_dirs(input_root, args.detail_files)
+    if not periods:
+        print(f"No period directories with {args.detail_files} under {input_root}")
+        return []
+
+    print(f'Timecard Script: Version {VERSION} [{VER_DATE}]')
+    print(f"Batch: {len(periods)} periods, {args.workers or os.cpu_count()} workers")
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(run_batch_period, args, period,
+                        os.path.join(OUTPUT_DIR, os.path.relpath(period, input_root))): period
+            for period in periods
+        }
+        for future in as_completed(futures):
+            period = os.path.relpath(futures[future], input_root)
+            results[period] = future.result()
+            print(f"\n[{period}]\n{results[period]['log']}", end='')
+
+    print(f"\nBATCH SUMMARY:")
+    print(f"{'Period':<20} {'Date Range':<26} {'Records':>8} {'Emps':>6} {'Missing':>7} "
+          f"{'Diffs':>6} {'Reg Hrs':>10} {'OT Hrs':>8} {'Secs':>6}  Status")
+    for period in sorted(results):
+        result = results[period]
+        total = result['total']
+        print(f"{period:<20} {result['daterange']:<26} {result['records']:>8} "
+              f"{result['employees']:>6} {result['missing']:>7} {result['discrepancies']:>6} "
+              f"{total.get('hours', 0):>10.2f} "
+              f"{total.get('ot', 0):>8.2f} {result['seconds']:>6.2f}  {result['status']}")
+    return [results[period] for period in sorted(results)]
+
+
+def open_inotify(path):
+    """
+    A non-blocking inotify descriptor watching the files in path, or None
+    where inotify isn't available (not Linux, no libc, out of watches).
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    import ctypes
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(path), INOTIFY_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def input_snapshot(input_dir, pattern=DETAIL_PATTERN):
+    """(file name, size, mtime) of every input file in input_dir, to spot writes without reading them."""
+    inputs = {f"{name}.csv" for name in INPUT_FILES[1:]}
+    try:
+        return tuple(sorted(
+            (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(input_dir)
+            if entry.name in inputs or fnmatch.fnmatch(entry.name, pattern)))
+    except FileNotFoundError:
+        # input_dir or a file in it is being replaced, look again on the next event
+        return ()
+
+
+def wait_for_inputs(input_dir, pattern, snapshot, fd=None, debounce=WATCH_DEBOUNCE):
+    """
+    Blocks until the input files differ from snapshot and have then stayed
+    unchanged for debounce seconds, so a burst of writes (an export copied in
+    several steps, the three files dropped one after another) is one run.
+    Waits on the inotify descriptor fd, or polls every WATCH_POLL_SECONDS.
+
+    Returns:
+        tuple: the new input_snapshot
+    """
+    latest, quiet_since = snapshot, None
+    while True:
+        if fd is None:
+            time.sleep(WATCH_POLL_SECONDS)
+        else:
+            timeout = None if quiet_since is None else \
+                max(0, debounce - (time.monotonic() - quiet_since))
+            if select.select([fd], [], [], timeout)[0]:
+                # the events only wake us up, the snapshot says what changed
+                with contextlib.suppress(BlockingIOError):
+                    while os.read(fd, 65536):
+                        pass
+        current = input_snapshot(input_dir, pattern)
+        if current != latest:
+            latest, quiet_since = current, time.monotonic()
+        elif quiet_since is not None and time.monotonic() - quiet_since >= debounce:
+            if latest != snapshot:
+                return latest
+            quiet_since = None
+
+
+def run_watch(args, input_dir=INPUT_DIR, output_dir=OUTPUT_DIR):
+    """
+    Regenerates the report whenever the inputs in input_dir change, until
+    interrupted. The process and the modules it imported stay loaded between
+    runs and only the outputs built from a changed file are rewritten. A run
+    that fails (e.g. an export still being copied) is reported and retried on
+    the next change.
+    """
+    fd = None if args.poll else open_inotify(input_dir)
+    how = 'inotify' if fd is not None else f"polling every {WATCH_POLL_SECONDS:g}s"
+    print(f'Timecard Script: Version {VERSION} [{VER_DATE}]')
+    print(f"Watching {input_dir} ({how}), press Ctrl+C to stop")
+    digests = {}  # input -> digest at the last successful run
+    snapshot = input_snapshot(input_dir, args.detail_files)
+    try:
+        while True:
+            try:
+                current = input_digests(input_dir, detail_names(input_dir, args.detail_files),
+                                        args.dedupe)
+                changed = {name for name in INPUT_FILES if current[name] != digests.get(name)}
+                if changed:
+                    print(f"\n[{datetime.now():%Y-%m-%d %H:%M:%S}] "
+                          f"{'Starting' if not digests else 'Changed: ' + ', '.join(sorted(changed))}")
+                    result = run_period(args, input_dir, output_dir, changed if digests else None)
+                    print_totals(result['total'])
+                    digests = current
+            except Exception as e:
+                print(f"FAILED: {type(e).__name__}: {e}")
+            snapshot = wait_for_inputs(input_dir, args.detail_files, snapshot, fd, args.debounce)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def render_page(report, path, groups):
+    """
+    Renders one page of the --serve report server:
+
+        /                          summary table and employee index
+        /report                    the full HTML report
+        /reconciliation            the reconcile_hours discrepancies
+        /employee/<id>             one employee's weeks and period total
+        /employee/<id>/week/<n>    one of the employee's weeks
+
+    Employee pages only read that employee's rows, found through groups
+    (employee_groups of report).
+
+    Returns:
+        str: the HTML, or None if there is no such page
+    """
+    parts = path.strip('/').split('/')
+    f = io.StringIO()
+    if parts == ['']:
+        f.write(HTML_HEAD)
+        write_summary_table(f, report)
+        write_employee_index(f, report, groups)
+        f.write(HTML_TAIL)
+    elif parts == ['report']:
+        write_html_report(f, report)
+    elif parts == ['reconciliation']:
+        write_reconciliation_html(f, report)
+    elif parts[0] == 'employee' and len(parts) in (2, 4) and parts[1] in groups:
+        employees = iter_employee_weeks(report, groups[parts[1]])
+        if len(parts) == 4:
+            if parts[2] != 'week' or not parts[3].isdigit():
+                return None
+            employees = [(emp_id, name, [week for week in weeks if week[0] == int(parts[3])], None)
+                         for emp_id, name, weeks, _ in employees]
+            if not employees[0][2]:
+                return None
+        f.write(HTML_HEAD)
+        f.write(DETAIL_TABLE_HEAD(report['per_start'], report['per_end']))
+        write_employee_tables(f, report, employees)
+        f.write(DETAIL_TABLE_TAIL)
+        f.write(HTML_TAIL)
+    else:
+        return None
+    return f.getvalue()
+
+
+def refresh_report(state):
+    """
+    Rebuilds the --serve report when its inputs changed and starts a new, empty
+    page cache. The inputs are stat()ed on every request, hashed only when
+    that moved, and the report is rebuilt only when a digest changed. If the
+    rebuild fails the old snapshot is kept, so the next request tries again.
+    """
+    args, input_dir = state['args'], state['input_dir']
+    snapshot = input_snapshot(input_dir, args.detail_files)
+    if snapshot == state['snapshot']:
+        return
+    with state['lock']:
+        if snapshot == state['snapshot']:
+            return  # rebuilt by another request meanwhile
+        digests = input_digests(input_dir, detail_names(input_dir, args.detail_files),
+                                args.dedupe)
+        if digests != state['digests']:
+            started = time.perf_counter()
+            report, _, records = build_report(args, input_dir)
+            # one assignment, so requests see the report, its index and its pages together
+            state['current'] = (report, employee_groups(report), {})
+            state['digests'] = digests
+            print(f"Loaded {records} records for {report['start_date']} - {report['end_date']} "
+                  f"in {time.perf_counter() - started:.2f}s")
+        state['snapshot'] = snapshot
+
+
+def serve_page(state, path):
+    """
+    The (body, etag) of a --serve page, rendered once per version of the
+    inputs and then answered from the page cache. None if there is no such page.
+    """
+    refresh_report(state)
+    report, groups, pages = state['current']
+    if path not in pages:
+        html = render_page(report, path, groups)
+        if html is None:
+            return None
+        body = html.encode('utf-8')
+        pages[path] = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    return pages[path]
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches etag (weak comparison, RFC 9110)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def run_serve(args, input_dir=INPUT_DIR):
+    """
+    Serves the report pages (see render_page) on SERVE_HOST until
+    interrupted, rebuilding the report when the files in input_dir change.
+    Pages are cached in memory with an ETag, so a browser revalidating an
+    unchanged page gets a 304.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import unquote, urlsplit
+
+    state = {'args': args, 'input_dir': input_dir, 'snapshot': None, 'digests': None,
+             'current': None, 'lock': threading.Lock()}
+
+    class ReportHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.respond(send_body=True)
+
+        def do_HEAD(self):
+            self.respond(send_body=False)
+
+        def respond(self, send_body):
+            started = time.perf_counter()
+            path = '/' + unquote(urlsplit(self.path).path).strip('/')
+            try:
+                page = serve_page(state, path)
+            except Exception as e:
+                self.send_error(503, "Report inputs could not be read", f"{type(e).__name__}: {e}")
+                return
+            if page is None:
+                self.send_error(404)
+                return
+            body, etag = page
+            not_modified = etag_matches(self.headers.get('If-None-Match'), etag)
+            self.send_response(304 if not_modified else 200)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Server-Timing',
+                             f"page;dur={(time.perf_counter() - started) * 1000:.1f}")
+            if not_modified:
+                self.end_headers()
+                return
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+    print(f'Timecard Script: Version {VERSION} [{VER_DATE}]')
+    refresh_report(state)  # up front, so bad inputs fail now and the first page is quick
+    server = ThreadingHTTPServer((SERVE_HOST, args.port), ReportHandler)
+    print(f"Serving the report at http://{SERVE_HOST}:{server.server_port}/, press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped serving")
+    finally:
+        server.server_close()
+
+
+# SQLite history written by --history. Periods are keyed by the first day of
+# the pay period (YYYY-MM-DD); a date belongs to one period, so a re-export
+# that overlaps an earlier one moves its rows over (and drops the earlier
+# period once it has none left).
+HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS periods (
+        period TEXT PRIMARY KEY,
+        period_end TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        records INTEGER NOT NULL,
+        loaded_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS detail (
+        emp_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        period TEXT NOT NULL,
+        week INTEGER NOT NULL,
+        hours REAL NOT NULL,
+        ot REAL NOT NULL,
+        PRIMARY KEY (emp_id, date)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS detail_period ON detail (period);
+    CREATE TABLE IF NOT EXISTS summary (
+        period TEXT NOT NULL,
+        emp_id TEXT NOT NULL,
+        hours REAL, ot REAL, holiday REAL, personal REAL, sick REAL, other REAL, pto REAL,
+        total_hrs REAL, approved TEXT,
+        PRIMARY KEY (period, emp_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS summary_emp ON summary (emp_id, period);
+    CREATE TABLE IF NOT EXISTS payroll (
+        period TEXT NOT NULL,
+        emp_id TEXT NOT NULL,
+        hire_date TEXT, name TEXT, title TEXT, location TEXT, schedule TEXT, status TEXT,
+        manager TEXT,
+        PRIMARY KEY (period, emp_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS payroll_manager ON payroll (manager, period);
+"""
+# query --by: (group key, second column header, second column) over detail d
+# joined to the payroll snapshot p of the same period
+HISTORY_ROLLUPS = {
+    'employee': ("d.emp_id", 'Employee Name', f"COALESCE(MAX(p.name), '{MISSING}')"),
+    'manager': (f"COALESCE(p.manager, '{MISSING}')", 'Emps', "COUNT(DISTINCT d.emp_id)"),
+    'period': ("d.period", 'Emps', "COUNT(DISTINCT d.emp_id)"),
+}
+
+
+def open_history(db_path=HISTORY_DB):
+    import sqlite3
+    # a long busy timeout, --batch workers store their periods concurrently
+    con = sqlite3.connect(db_path, timeout=60)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    con.executescript(HISTORY_SCHEMA)
+    return con
+
+
+def column_list(column):
+    """A detail column as a list of Python numbers, which is what sqlite3 binds."""
+    return column.tolist() if hasattr(column, 'tolist') else column
+
+
+def store_history(report, records, db_path=HISTORY_DB):
+    """
+    Upserts the period of report (its detail, summary and payroll snapshot)
+    into the history database in one transaction. Running a period again
+    replaces what was stored for it. Several approved_hours rows for an
+    employee and day are stored as one row with their hours summed; days that
+    move over from an earlier period are taken out of its row count, and a
+    period left without detail is dropped.
+
+    Returns:
+        str: the period key, None for an empty period
+    """
+    calendar = report['calendar']
+    if report['start_date'] == 'NONE':
+        print("History: no approved_hours rows, nothing stored")
+        return None
+    period = str(calendar['period_start'])
+    detail, directory = report['detail'], report['directory']
+    ids = [str(emp_id) for emp_id, _ in report['employees']]
+    labels, first_day = calendar['label'], calendar['first_day']
+    detail_rows = zip([ids[emp] for emp in column_list(detail['emp'])],
+                      [labels[day - first_day] for day in column_list(detail['day'])],
+                      column_list(detail['week']), column_list(detail['hours']),
+                      column_list(detail['ot']))
+    summary_rows = ((period, str(emp_id), *row[5:])
+                    for emp_id, row in zip(report['summary_ids'], report['summary']))
+    payroll_rows = ((period, emp_id, *fields)
+                    for emp_id, *fields in zip(directory['ids'],
+                                               *(directory[field] for field in INFO_FIELDS)))
+
+    con = open_history(db_path)
+    try:
+        with con:
+            for table in ['detail', 'summary', 'payroll']:
+                con.execute(f"DELETE FROM {table} WHERE period = ?", (period,))
+            con.execute("CREATE TEMP TABLE staged (emp_id TEXT, date TEXT, week INTEGER, "
+                        "hours REAL, ot REAL)")
+            con.executemany("INSERT INTO staged VALUES (?, ?, ?, ?, ?)", detail_rows)
+            moved = con.execute(
+                "SELECT d.period, COUNT(*) FROM detail d "
+                "JOIN (SELECT DISTINCT emp_id, date FROM staged) s USING (emp_id, date) "
+                "GROUP BY d.period").fetchall()
+            # WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+            stored = con.execute(
+                "INSERT INTO detail SELECT emp_id, date, ?, MIN(week), SUM(hours), SUM(ot) "
+                "FROM staged WHERE true GROUP BY emp_id, date ON CONFLICT (emp_id, date) DO UPDATE "
+                "SET period = excluded.period, week = excluded.week, hours = excluded.hours, "
+                "ot = excluded.ot", (period,)).rowcount
+            con.execute("DROP TABLE staged")
+            con.execute(
+                "INSERT INTO periods VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (period) DO UPDATE SET "
+                "period_end = excluded.period_end, start_date = excluded.start_date, "
+                "end_date = excluded.end_date, records = excluded.records, "
+                "loaded_at = excluded.loaded_at",
+                (period, str(calendar['period_end']), report['start_date'], report['end_date'],
+                 stored, datetime.now().isoformat(timespec='seconds')))
+            for earlier, count in moved:
+                left = con.execute("SELECT COUNT(*) FROM detail WHERE period = ?",
+                                   (earlier,)).fetchone()[0]
+                if left:
+                    con.execute("UPDATE periods SET records = ? WHERE period = ?", (left, earlier))
+                else:
+                    for table in ['summary', 'payroll', 'periods']:
+                        con.execute(f"DELETE FROM {table} WHERE period = ?", (earlier,))
+                print(f"History: {count} day(s) moved over from period {earlier}"
+                      f"{'' if left else ', which is now empty and was dropped'}")
+            con.executemany("INSERT INTO summary VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            summary_rows)
+            con.executemany("INSERT INTO payroll VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            payroll_rows)
+    finally:
+        con.close()
+    print(f"History: stored period {period} ({stored} employee days from {records} detail rows) "
+          f"in {db_path}")
+    return period
+
+
+def query_history(db_path=HISTORY_DB, by='employee', employees=None, manager=None,
+                  period=None, from_date=None, to_date=None):
+    """
+    Rolls up the stored detail per employee, manager or period, optionally
+    for some employees, one manager, one period and/or a date range. The
+    filters map onto the (emp_id, date), detail(period) and payroll(manager)
+    indexes.
+
+    Returns:
+        list: (key, name or employee count, days, reg, ot, total) tuples
+    """
+    key, _, second = HISTORY_ROLLUPS[by]
+    where, params = [], []
+    if employees:
+        where.append(f"d.emp_id IN ({', '.join('?' * len(employees))})")
+        params += employees
+    if manager:
+        where.append("p.manager = ?")
+        params.append(manager)
+    if period:
+        where.append("d.period = ?")
+        params.append(str(period))
+    if from_date:
+        where.append("d.date >= ?")
+        params.append(str(from_date))
+    if to_date:
+        where.append("d.date <= ?")
+        params.append(str(to_date))
+    sql = (f"SELECT {key}, {second}, COUNT(*), SUM(d.hours), SUM(d.ot), SUM(d.hours + d.ot) "
+           f"FROM detail d LEFT JOIN payroll p ON p.period = d.period AND p.emp_id = d.emp_id "
+           f"{'WHERE ' + ' AND '.join(where) if where else ''} GROUP BY 1 ORDER BY 1")
+    con = open_history(db_path)
+    try:
+        return con.execute(sql, params).fetchall()
+    finally:
+        con.close()
+
+
+def run_query(args):
+    """The query subcommand: prints a query_history rollup as a table or CSV."""
+    if not os.path.exists(args.db):
+        sys.exit(f"No history database at {args.db}, run the report with --history first")
+    started = time.perf_counter()
+    rows = query_history(args.db, args.by, args.employee, args.manager, args.period,
+                         args.from_date, args.to_date)
+    elapsed = time.perf_counter() - started
+    headers = [args.by.capitalize(), HISTORY_ROLLUPS[args.by][1], 'Days', 'Reg Hrs', 'OT Hrs',
+               'Total Hrs']
+    if args.csv:
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(headers)
+        writer.writerows(row[:3] + tuple(f"{value:.2f}" for value in row[3:]) for row in rows)
+        return
+    print(f"{headers[0]:<30} {headers[1]:<30} {'Days':>6} {'Reg Hrs':>10} {'OT Hrs':>8} "
+          f"{'Total Hrs':>10}")
+    for key, second, days, reg, ot, total in rows:
+        print(f"{str(key)[:30]:<30} {str(second)[:30]:<30} {days:>6} {reg:>10.2f} {ot:>8.2f} "
+              f"{total:>10.2f}")
+    print(f"{len(rows)} row(s) in {elapsed * 1000:.1f} ms")
+
+
+def parse_query_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='timecard.py query',
+        description="Roll up the approved hours stored with --history across periods.")
+    parser.add_argument('--by', choices=list(HISTORY_ROLLUPS), default='employee',
+                        help="one row per employee, manager (as of each period) or pay period")
+    parser.add_argument('--employee', action='append',
+                        help="only this employee number (can be repeated)")
+    parser.add_argument('--manager', help="only employees reporting to this manager")
+    parser.add_argument('--period', type=date.fromisoformat,
+                        help="only the pay period starting on this day (YYYY-MM-DD)")
+    parser.add_argument('--from', dest='from_date', type=date.fromisoformat,
+                        help="only days on or after this one (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='to_date', type=date.fromisoformat,
+                        help="only days on or before this one (YYYY-MM-DD)")
+    parser.add_argument('--db', default=HISTORY_DB, help="history database to read")
+    parser.add_argument('--csv', action='store_true', help="print CSV instead of a table")
+    return parser.parse_args(argv)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the Flockx timecard report.")
+    parser.add_argument('--batch', action='store_true',
+                        help="process every period directory under --input-root in parallel")
+    parser.add_argument('--input-root', default=INPUT_DIR,
+                        help="root folder searched for period directories in --batch mode")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes in --batch and --by-manager mode "
+                             "(default: one per core)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and regenerate the report whenever the files "
+                             "in the input folder change")
+    parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE,
+                        help="seconds the inputs must stay unchanged before a --watch run")
+    parser.add_argument('--poll', action='store_true',
+                        help="in --watch mode, poll the input folder instead of using inotify "
+                             "(for network drives)")
+    parser.add_argument('--serve', action='store_true',
+                        help="serve the report pages over HTTP on this machine, rebuilt "
+                             "when the input files change")
+    parser.add_argument('--port', type=int, default=SERVE_PORT,
+                        help="port for --serve")
+    parser.add_argument('--by-manager', action='store_true',
+                        help="also write a summary/detail CSV and HTML report per payroll_info "
+                             "Manager, with an index page, under managers_<range>/")
+    parser.add_argument('--history', action='store_true',
+                        help="also store the period in the SQLite history database "
+                             "(see 'timecard.py query --help')")
+    parser.add_argument('--db', default=HISTORY_DB,
+                        help="history database for --history")
+    parser.add_argument('--engine', choices=['auto', 'light', 'pandas'], default='auto',
+                        help="'light' reads the inputs with the stdlib csv module and never "
+                             "imports pandas; 'auto' uses it for small inputs")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="ignore and don't update the parsed-input cache")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only process approved_hours rows that are new or changed "
+                             "since the last --incremental run")
+    parser.add_argument('--profile', action='store_true',
+                        help="print wall/CPU time, rows and peak memory per stage and write "
+                             "them to profile_<range>.json next to the outputs")
+    parser.add_argument('--cprofile', action='store_true',
+                        help="--profile, and also dump a cProfile of the slowest stage "
+                             "to profile_<range>.prof")
+    parser.add_argument('--stream', action='store_true',
+                        help="read approved_hours.csv in chunks to bound memory")
+    parser.add_argument('--format', choices=['csv'] + sorted(TABLE_FORMATS), default='csv',
+                        help="file format for the summary and detail tables")
+    parser.add_argument('--csv-engine', choices=sorted(CSV_WRITERS), default='csv',
+                        help="write the CSV outputs row by row with csv.writer or "
+                             "in one go with DataFrame.to_csv")
+    parser.add_argument('--chunk-rows', type=int, default=DETAIL_CHUNK_ROWS,
+                        help="rows per chunk in --stream mode")
+    parser.add_argument('--detail-files', default=DETAIL_PATTERN,
+                        help="glob for the approved_hours export(s) in the input folder, e.g. "
+                             "'approved_hours*.csv' when the export is split by department")
+    parser.add_argument('--dedupe', choices=DEDUPE_POLICIES, default='last',
+                        help="when several exports have rows for the same employee and date, keep "
+                             "that day's rows from the last export, sum them, or stop")
+    parser.add_argument('--ot-rules', action='store_true',
+                        help="recompute OT and double time per employee and week under the labor "
+                             "rules for their Location and list weeks where the exported OT "
+                             "differs in ot_check_<range>.csv")
+    parser.add_argument('--tolerance', type=float, default=RECONCILE_TOLERANCE,
+                        help="hours an employee's detail Reg/OT sums may differ from "
+                             "summary_hours before it is reported as a discrepancy")
+    parser.add_argument('--output-workers', type=int, default=OUTPUT_WORKERS,
+                        help="threads writing the output files in parallel (1 writes them "
+                             "one after another)")
+    parser.add_argument('--period-anchor', type=date.fromisoformat, default=None,
+                        help="first day (a Sunday, YYYY-MM-DD) of any biweekly pay period; "
+                             "weeks are numbered from the period the input starts in")
+    args = parser.parse_args(argv)
+    args.profile = args.profile or args.cprofile
+    if not args.detail_files.endswith('.csv') or os.sep in args.detail_files:
+        parser.error("--detail-files must be a file name pattern ending in .csv")
+    if args.watch and args.batch:
+        parser.error("--watch watches a single input folder and can't be used with --batch")
+    if args.serve and (args.batch or args.watch):
+        parser.error("--serve can't be combined with --batch or --watch")
+    if args.period_anchor and args.period_anchor.weekday() != 6:
+        parser.error("--period-anchor must be a Sunday")
+    if args.engine == 'light' and (args.stream or args.incremental or args.format != 'csv'
+                                   or args.csv_engine != 'csv'):
+        parser.error("--engine light only supports CSV output with the csv engine")
+    if args.engine == 'light' and args.ot_rules:
+        parser.error("--ot-rules needs pandas, it can't be used with --engine light")
+    return args
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['query']:
+        run_query(parse_query_args(argv[1:]))
+        return
+    args = parse_args(argv)
+
+    if args.batch:
+        run_batch(args)
+        return
+    if args.watch:
+        run_watch(args)
+        return
+    if args.serve:
+        run_serve(args)
+        return
+
+    result = run_period(args)
+    print_totals(result['total'])
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if getattr(sys, 'frozen', False):
+        # the PyInstaller executable needs this for the --batch process pool
+        import multiprocessing
+        multiprocessing.freeze_support()
+    main()